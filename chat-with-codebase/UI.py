@@ -1,5 +1,7 @@
 import streamlit as st
 import requests
+import time
+import json
 
 # Set up Streamlit layout
 
@@ -25,6 +27,74 @@ if "api_settings" not in st.session_state:
         "file_location":""
     }
 
+API_BASE = "http://127.0.0.1:8000"
+
+if "jobs" not in st.session_state:
+    st.session_state.jobs = {}
+
+
+def submit_job(kind, payload):
+    """Submit a background job and remember its id so it can be cancelled on a later rerun."""
+    response = requests.post(f"{API_BASE}/jobs/{kind}", json=payload, timeout=10)
+    response.raise_for_status()
+    job_id = response.json()["job_id"]
+    st.session_state.jobs[kind] = job_id
+    return job_id
+
+
+def poll_job(job_id):
+    """Poll the job status endpoint until the job finishes, updating a progress bar."""
+    progress_bar = st.progress(0.0)
+    status_text = st.empty()
+    while True:
+        job = requests.get(f"{API_BASE}/jobs/{job_id}", timeout=10).json()
+        progress_bar.progress(min(1.0, job["progress"]))
+        eta = f", ETA {job['eta_seconds']:.0f}s" if job.get("eta_seconds") is not None else ""
+        status_text.write(
+            f"{job['status']}: {job['files_parsed']}/{job['files_total']} files parsed, "
+            f"{job['entities_summarized']} entities summarized, {job['nodes_written']} nodes written{eta}"
+        )
+        if job["status"] in ("completed", "failed", "cancelled"):
+            return job
+        time.sleep(1)
+
+
+def show_job_result(job):
+    if job["status"] == "completed":
+        st.success("Success\n" + str(job["result"]))
+    elif job["status"] == "cancelled":
+        st.warning("Cancelled")
+    else:
+        st.error(f"Error: {job.get('error')}")
+
+
+def cancel_button(kind):
+    """
+    Cancel control for the running job of this kind. It is rendered before polling starts, so a click
+    while the job runs reruns the script, which stops the poll and sends the cancel request here.
+    """
+    job_id = st.session_state.jobs.get(kind)
+    if job_id and st.button("Cancel", key=f"cancel_{kind}"):
+        try:
+            requests.post(f"{API_BASE}/jobs/{job_id}/cancel", timeout=10)
+            st.warning("Cancellation requested")
+            show_job_result(poll_job(job_id))
+            st.session_state.jobs.pop(kind, None)
+        except requests.exceptions.RequestException as e:
+            st.error(f"Error connecting to backend: {e}")
+
+
+def run_job(kind, payload):
+    """Submit a background job, show its cancel control and poll it until it finishes."""
+    try:
+        # Submit a background job and poll its status instead of holding one request open
+        job_id = submit_job(kind, payload)
+        cancel_button(kind)
+        show_job_result(poll_job(job_id))
+        st.session_state.jobs.pop(kind, None)
+    except requests.exceptions.RequestException as e:
+        st.error(f"Error connecting to backend: {e}")
+
 # Sidebar for another API invocation settings
 with st.sidebar:
     st.header("API Coniguration")
@@ -41,31 +111,15 @@ with st.sidebar:
 
     # Button to invoke the API
     if st.button("Parse"):
-        # API URL for the invocation
-        API_URL = "http://127.0.0.1:8000/code_parser_with_summary"
-
         # Prepare payload for the API
         payload = {
             "code_dir": st.session_state.api_settings["code_dir"],
             "allowed_extn": st.session_state.api_settings["allowed_extn"],
             "code_summary": st.session_state.api_settings["code_summary"],
         }
-
-        try:
-            # Make API request
-            with st.spinner("Parsing..."):
-                response = requests.post(API_URL, json=payload, timeout=60)
-            
-                if response.status_code == 200:
-                    st.success("Success\n" + response.text)
-                    
-                    #st.json(response.json())
-                else:
-                    st.error(f"Error: {response.status_code}. Could not complete the request.")
-                    st.write(response.text)
-
-        except requests.exceptions.RequestException as e:
-            st.error(f"Error connecting to backend: {e}")
+        run_job("parse", payload)
+    else:
+        cancel_button("parse")
     
     # Section for API 2
     st.subheader("Configuration for ingesting data")
@@ -75,45 +129,65 @@ with st.sidebar:
     )
 
     if st.button("Ingest Data"):
-        API_URL_2 = "http://127.0.0.1:8000/ingest_data"
         payload = {
            "file_location":  st.session_state.api_settings["file_location"]
         }
-        
-        try:
-            with st.spinner("Loading..."):
-                
-                response = requests.post(API_URL_2, json=payload, timeout=60)
-                print(response.text)
-                if response.status_code == 200:
-                    st.success("Success! " + response.text)
-                    #st.json(response.json())
-                else:
-                    st.error(f"Error: {response.status_code}. Could not complete the request.")
-                    st.write(response.text)
-        except requests.exceptions.RequestException as e:
-            st.error(f"Error connecting to backend: {e}")
+        run_job("ingest", payload)
+    else:
+        cancel_button("ingest")
 
 # Chat interface below
 
 
-# Function to send query to backend
-def send_query_to_api(query):
-    ASK_URL = "http://127.0.0.1:8000/ask_code"
+def iter_sse(response):
+    """(event, data) pairs from a server-sent-event response."""
+    event = None
+    for line in response.iter_lines(decode_unicode=True):
+        if line.startswith("event:"):
+            event = line[len("event:"):].strip()
+        elif line.startswith("data:") and event:
+            yield event, json.loads(line[len("data:"):])
+            event = None
+
+
+def stream_query_to_api(query):
+    """
+    Ask through /ask_code/stream, rendering workflow progress, the generated Cypher and row counts in a
+    status box and the answer tokens as they arrive. Returns the final answer.
+    """
+    status = st.status("Thinking...", expanded=False)
+    answer_box = st.empty()
+    answers = {}  # run_id -> streamed text, one run per sub-query
     try:
-        response = requests.post(ASK_URL, json={"USER_INPUT": query}, ) #timeout=10
-        
-        # Handle non-JSON responses gracefully
-        if response.status_code == 200:
-            response_data = response.json()
-            return response_data
-        else:
-            return f"Error: {response.status_code}. Could not retrieve a valid response."
-    
-    except ValueError:
-        return f"Non-JSON response: {response.text}"
+        with requests.post(f"{API_BASE}/ask_code/stream", json={"USER_INPUT": query}, stream=True) as response:
+            if response.status_code != 200:
+                status.update(label="Error", state="error")
+                return f"Error: {response.status_code}. Could not retrieve a valid response."
+            for event, data in iter_sse(response):
+                if event == "node":
+                    if data["status"] == "start":
+                        status.update(label=f"Running {data['node']}...")
+                elif event == "sub_queries":
+                    status.markdown(f"**Sub-queries**\n\n{data['text']}")
+                elif event == "cypher":
+                    status.code(data["cypher"], language="cypher")
+                elif event == "rows":
+                    status.write(f"{data['count']} rows")
+                elif event == "token":
+                    answers[data["run_id"]] = answers.get(data["run_id"], "") + data["text"]
+                    answer_box.markdown("\n\n".join(answers.values()))
+                elif event == "answer":
+                    status.update(label="Done", state="complete")
+                    answer_box.empty()
+                    return data["answer"]
+                elif event == "error":
+                    status.update(label="Error", state="error")
+                    return f"Error: {data['error']}"
     except requests.exceptions.RequestException as e:
+        status.update(label="Error", state="error")
         return f"Error connecting to backend: {e}"
+    status.update(label="Error", state="error")
+    return "Error: the response ended without an answer."
 
 
 # Display chat messages from history on app rerun
@@ -129,12 +203,9 @@ if user_input := st.chat_input("Ask me something"):
     # Add user message to chat history
     st.session_state.messages.append({"role": "user", "content": user_input})
 
-    # Display a spinner while waiting for the response
-    with st.spinner("Thinking..."):
-        bot_response = send_query_to_api(user_input)
-
-    # Display assistant response in chat message container
+    # Display assistant response in chat message container, rendered progressively as it streams
     with st.chat_message("assistant"):
+        bot_response = stream_query_to_api(user_input)
         st.markdown(bot_response)
     
     # Add assistant response to chat history
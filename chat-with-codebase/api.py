@@ -1,18 +1,25 @@
 # API
-from fastapi import FastAPI, Request
+from fastapi import FastAPI, Request, HTTPException
 from fastapi.responses import StreamingResponse
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
 from pydantic import BaseModel
 
-from code_parsing import extract_hierarchy_with_code
-from neo4j_lib import Neo4jLoader
-from lg_neo4j  import build_workflow
+from code_parsing import extract_hierarchy_with_code, read_entities, count_node_entities
+from neo4j_lib import Neo4jLoader, init_driver, get_driver, close_driver, pool_metrics
+from neo4j_import import export_for_import
+from graph_backend import get_backend, close_backend, schema_cache, graph_changed, graph_version
+from query_cache import normalize_question, answer_cache, query_cache_stats
+from question_router import router_stats
+from code_store import CodeStore
+from jobs import job_manager
+from lg_neo4j  import get_workflow, get_components, QA_TAG
 from langchain_core.messages import SystemMessage, HumanMessage
 
 import json
 import os
+import threading
 
 app = FastAPI()
 
@@ -33,55 +40,168 @@ class CodeDescription(BaseModel):
     code_dir: str
     allowed_extn: str
     code_summary: str
+    workers: int = 1
+    incremental: bool = False
+    summary_concurrency: int = 1
+    summary_batch_tokens: int = 0
+    stream: bool = False
+    compact: bool = False
 
 class Code(BaseModel):
     file_location: str
+    bulk: bool = False
+    batch_size: int = 1000
+    batches_per_transaction: int = 1
+    import_dir: str = ""
+    sync: bool = False
+    writers: int = 1
 
 
-@app.post("/code_parser_with_summary")
-def code_parser_with_summary(codeDesc: CodeDescription):
+# Parse runs write the same output file and manifest (which incremental runs reuse), so they run one at a time
+_parse_lock = threading.Lock()
+
+
+def run_code_parser(codeDesc, progress=None):
     # Get user input for root path and allowed extensions
     root_path = codeDesc.code_dir 
     extensions = codeDesc.allowed_extn
-    output_file = "code_parser.json"
-    includes = ["folders", "files","functions", "classes", "methods", "inline_code"]
+    output_file = "code_parser.jsonl" if codeDesc.stream else "code_parser.json"
+    includes = ["folders", "files","functions", "classes", "methods", "inline_code", "relationships"]
     summary_flag = codeDesc.code_summary
     #"imports",
     # Convert extensions input into a list
     allowed_extensions = [ext.strip() for ext in extensions.split(",")]
 
     # Extract files and save to JSON
-    file_data = extract_hierarchy_with_code(root_path, allowed_extensions, includes, output_file, summary_flag)
+    with _parse_lock:
+        file_data = extract_hierarchy_with_code(root_path, allowed_extensions, includes, output_file, summary_flag,
+                                                workers=codeDesc.workers, incremental=codeDesc.incremental,
+                                                summary_concurrency=codeDesc.summary_concurrency,
+                                                summary_batch_tokens=codeDesc.summary_batch_tokens,
+                                                stream=codeDesc.stream, compact=codeDesc.compact, progress=progress)
+    entity_count = file_data if codeDesc.stream else len(file_data)
     
     # Print a summary
     
-    response = f"Extracted {len(file_data)} files. File Location :" + output_file
+    response = f"Extracted {entity_count} files. File Location :" + output_file
     print(response)
     return response
 
-@app.post("/ingest_data")
-def ingest_data(code:Code):
-    output_file = code.file_location 
+@app.post("/code_parser_with_summary")
+def code_parser_with_summary(codeDesc: CodeDescription):
+    return run_code_parser(codeDesc)
+
+def run_ingest(output_file, progress=None, bulk=False, batch_size=1000, batches_per_transaction=1, import_dir="",
+               sync=False, writers=1):
     print(output_file)
-    try:
-        with open(output_file, 'r', encoding='utf-8') as json_file:
-            file_data = json.load(json_file)  # Load the JSON content
-            print("File Data :\n")
-            print(file_data)
-    except Exception as e:
-        print(f"Error reading JSON file: {e}")
+    if not os.path.exists(output_file):
+        print(f"Error reading JSON file: {output_file} not found")
+        return f"File not found: {output_file}"
+    # JSON or JSONL parser output, read lazily while loading; compact code references are resolved on the way
+    code_store = CodeStore()
+    file_data = code_store.resolve_entities(read_entities(output_file))
+    if progress:
+        # Relationship records and pathless inline code entries are not written as nodes
+        progress("nodes_written", 0, count_node_entities(output_file))
+
+    if import_dir:
+        # Offline mode: write neo4j-admin import files instead of loading through the driver
+        try:
+            counts, command = export_for_import(file_data, import_dir, progress=progress)
+        finally:
+            code_store.close()
+        return {"import_dir": import_dir, "counts": counts, "command": command}
     
-    NEO4J_URI = os.getenv('NEO4J_URI')
-    NEO4J_USER = os.getenv('NEO4J_USER')
-    NEO4J_PASSWORD = os.getenv('NEO4J_PASSWORD') 
-    loader = Neo4jLoader(NEO4J_URI, NEO4J_USER, NEO4J_PASSWORD)
+    backend = get_backend()
+    if not backend.supports_cypher:
+        # Embedded backend (GRAPH_BACKEND=sqlite)
+        try:
+            result = backend.load(file_data, progress=progress, batch_size=batch_size)
+        finally:
+            code_store.close()
+            graph_changed()
+        print(f"Ingested {output_file}.")
+        return "Successuflly ingested"
+
+    # Writes go through the app-wide pooled driver
+    loader = Neo4jLoader(driver=get_driver())
 
     # Load the data into Neo4j
-    result = loader.load_data(file_data)
+    try:
+        if sync:
+            # Only rewrite files whose content hash differs from the one stored on their file node
+            result = loader.sync_data(file_data, progress=progress, batch_size=batch_size)
+        else:
+            result = loader.load_data(file_data, progress=progress, bulk=bulk, batch_size=batch_size,
+                                      batches_per_transaction=batches_per_transaction, writers=writers)
+    finally:
+        code_store.close()
+        # New labels, relationships or properties may have been written
+        graph_changed()
     # Print a summary
-    print(f"Extracted {len(file_data)} files.")
+    print(f"Ingested {output_file}.")
     return "Successuflly ingested" #result
 
+@app.get("/graph/indexes")
+def graph_indexes():
+    return Neo4jLoader(driver=get_driver()).index_report()
+
+@app.get("/metrics")
+def metrics():
+    return {"neo4j": pool_metrics(), "schema_cache": schema_cache.stats(), "query_cache": query_cache_stats(),
+            "router": router_stats.stats()}
+
+@app.post("/ingest_data")
+def ingest_data(code:Code):
+    return run_ingest(code.file_location, bulk=code.bulk, batch_size=code.batch_size,
+                      batches_per_transaction=code.batches_per_transaction, import_dir=code.import_dir,
+                      sync=code.sync, writers=code.writers)
+
+# Background jobs: submit returns a job id, progress is polled from /jobs/{job_id}
+@app.post("/jobs/parse")
+def submit_parse_job(codeDesc: CodeDescription):
+    job = job_manager.submit("parse", run_code_parser, codeDesc, params=codeDesc.model_dump())
+    return {"job_id": job.id, "status": job.status}
+
+@app.post("/jobs/ingest")
+def submit_ingest_job(code: Code):
+    job = job_manager.submit("ingest", run_ingest, code.file_location, bulk=code.bulk, batch_size=code.batch_size,
+                             batches_per_transaction=code.batches_per_transaction, import_dir=code.import_dir,
+                             sync=code.sync, writers=code.writers, params=code.model_dump())
+    return {"job_id": job.id, "status": job.status}
+
+@app.get("/jobs/{job_id}")
+def job_status(job_id: str):
+    job = job_manager.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Unknown job {job_id}")
+    return job.to_dict()
+
+@app.post("/jobs/{job_id}/cancel")
+def cancel_job(job_id: str):
+    job = job_manager.cancel(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Unknown job {job_id}")
+    return job.to_dict()
+
+@app.on_event("startup")
+def startup_driver():
+    # The embedded backend does not need a Neo4j connection
+    if get_backend().supports_cypher:
+        init_driver()
+    # Compile the question workflow and create the LLM clients once for all requests
+    get_workflow()
+    try:
+        get_components()
+    except Exception as e:
+        print(f"LLM clients not created at startup, retrying on first question: {e}")
+
+@app.on_event("shutdown")
+def shutdown_jobs():
+    job_manager.shutdown()
+    close_backend()
+    close_driver()
+
 class Configuration (BaseModel):
     NEO4J_URI: str
     NEO4J_USER: str
@@ -90,25 +210,83 @@ class Configuration (BaseModel):
 class Question (BaseModel):
     USER_INPUT: str
 
+def final_answer(result):
+    """The answer returned to the user from the final workflow state."""
+    if "Query not relevant to schema" in result['sub_query'][-1].content:
+        return result['sub_query'][-1].content
+    return result['final_results'][-1].content
+    '''final_result = [
+        {
+            "input": result['user_query'][-1].content,
+            "sub_queries": result['sub_query'][-1].content,
+            "output": result['final_results'].content if result.get('final_results') else None
+        }
+    ]'''
+
 @app.post("/ask_code")
-def ask_code( user_input: Question ):
+async def ask_code( user_input: Question ):
     
     user_input = user_input.USER_INPUT
-    graph = build_workflow()
+    # A repeated question is answered from the cache until the next ingest changes the graph
+    cache_key = (normalize_question(user_input), graph_version())
+    cached = answer_cache.get(cache_key)
+    if cached is not None:
+        return cached
+    graph = get_workflow()
     inputs = {
                 "user_query": [HumanMessage(content=user_input)],
             }
-    result = graph.invoke(inputs)
-    if "Query not relevant to schema" in result['sub_query'][-1].content:
-        final_result = result['sub_query'][-1].content
-    else:
-        final_result = result['final_results'][-1].content
-        '''final_result = [
-            {
-                "input": result['user_query'][-1].content,
-                "sub_queries": result['sub_query'][-1].content,
-                "output": result['final_results'].content if result.get('final_results') else None
-            }
-        ]'''
+    result = await graph.ainvoke(inputs)
+    final_result = final_answer(result)
     #print(final_result)
+    if not result.get('failed'):
+        answer_cache.put(cache_key, final_result)
     return final_result
+
+WORKFLOW_NODES = ("router", "neo4j_graph", "simplifier", "translate_to_cypher")
+
+def sse(event, data):
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+async def stream_answer(user_input):
+    """
+    Server-sent events for one question: start, node (start/end of each workflow node), sub_queries,
+    cypher, rows (row count), token (answer tokens, grouped by run_id, one run per sub-query),
+    answer (the final answer, as returned by /ask_code), error.
+    """
+    yield sse("start", {"question": user_input})
+    cache_key = (normalize_question(user_input), graph_version())
+    cached = answer_cache.get(cache_key)
+    if cached is not None:
+        yield sse("answer", {"answer": cached, "cached": True})
+        return
+    inputs = {
+                "user_query": [HumanMessage(content=user_input)],
+            }
+    try:
+        async for event in get_workflow().astream_events(inputs, version="v2"):
+            kind = event["event"]
+            node = event.get("metadata", {}).get("langgraph_node")
+            if kind in ("on_chain_start", "on_chain_end") and event["name"] in WORKFLOW_NODES and node == event["name"]:
+                yield sse("node", {"node": node, "status": "start" if kind == "on_chain_start" else "end"})
+                if kind == "on_chain_end" and node == "simplifier":
+                    yield sse("sub_queries", {"text": str(event["data"]["output"]["sub_query"])})
+            elif kind == "on_custom_event" and event["name"] in ("cypher", "rows"):
+                yield sse(event["name"], event["data"])
+            elif kind == "on_chat_model_stream" and QA_TAG in event.get("tags", []):
+                text = event["data"]["chunk"].content
+                if text:
+                    yield sse("token", {"run_id": event["run_id"], "text": text})
+            elif kind == "on_chain_end" and not event["parent_ids"]:
+                final_result = final_answer(event["data"]["output"])
+                if not event["data"]["output"].get('failed'):
+                    answer_cache.put(cache_key, final_result)
+                yield sse("answer", {"answer": final_result, "cached": False})
+    except Exception as e:
+        print("\n*** Error occurred while streaming the answer ***\n", e)
+        yield sse("error", {"error": str(e)})
+
+@app.post("/ask_code/stream")
+async def ask_code_stream( user_input: Question ):
+    return StreamingResponse(stream_answer(user_input.USER_INPUT), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
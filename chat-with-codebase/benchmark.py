@@ -0,0 +1,359 @@
+"""
+Benchmark harness for the code-parsing and summarization pipeline.
+
+Generates a synthetic Python repository, replaces the OpenAI clients with fixed-latency fakes and runs
+extract_hierarchy_with_code in each requested mode in a fresh process. The graph_sqlite mode times loading
+the parser output into the embedded graph backend and answering the query templates instead. Reports files/sec, entities/sec,
+peak RSS and LLM call count, and writes the results as JSON so runs can be compared across commits:
+
+    python benchmark.py --files 500 --classes 3 --methods 5 --latency 0.02 --output bench.json
+    python benchmark.py --files 500 --compare bench.json
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import random
+import asyncio
+import argparse
+import platform
+import resource
+import tempfile
+import subprocess
+import multiprocessing
+
+MODES = ["sequential", "parallel", "async_summaries", "batched", "cached", "incremental", "stream", "compact",
+         "graph_sqlite"]
+
+
+def generate_synthetic_repo(root, files=100, classes_per_file=2, methods_per_class=4, functions_per_file=3,
+                            files_per_folder=20, seed=0):
+    """Write a synthetic Python repository of the given shape under root and return the number of files."""
+    rng = random.Random(seed)
+    for index in range(files):
+        folder = os.path.join(root, f"pkg_{index // files_per_folder}")
+        os.makedirs(folder, exist_ok=True)
+        lines = [f'"""Synthetic module {index}."""', "import os", "import json", ""]
+        lines.append(f"CONSTANT_{index} = {rng.randint(0, 1000)}")
+        lines.append("")
+        for f in range(functions_per_file):
+            lines += [
+                f"def function_{index}_{f}(value, factor={f + 1}):",
+                f'    """Scale value by factor for module {index}."""',
+                "    total = 0",
+                "    for item in range(value):",
+                "        total += item * factor",
+                f"    return helper_{index}(total)",
+                "",
+            ]
+        lines += [f"def helper_{index}(total):", "    return total % 97", ""]
+        for c in range(classes_per_file):
+            lines += [f"class Model_{index}_{c}:", f'    """Synthetic class {c} of module {index}."""', ""]
+            lines += ["    def __init__(self, name):", "        self.name = name", "        self.items = []", ""]
+            for m in range(methods_per_class):
+                lines += [
+                    f"    def method_{m}(self, value):",
+                    f'        """Method {m}."""',
+                    "        self.items.append(value)",
+                    f"        return len(self.items) + {m}",
+                    "",
+                ]
+        with open(os.path.join(folder, f"module_{index}.py"), "w", encoding="utf-8") as f:
+            f.write("\n".join(lines) + "\n")
+    return files
+
+
+class _Message:
+    def __init__(self, content):
+        self.content = content
+
+
+class _Choice:
+    def __init__(self, content):
+        self.message = _Message(content)
+
+
+class _Response:
+    def __init__(self, content):
+        self.choices = [_Choice(content)]
+        self.usage = None
+
+
+def fake_completion(messages, response_format=None):
+    if response_format is not None:
+        # Batched prompt: answer every "### id: N" segment
+        content = messages[-1]["content"]
+        ids = [line.split("### id:", 1)[1].strip() for line in content.splitlines() if "### id:" in line]
+        return json.dumps({"summaries": [{"id": i, "summary": f"Summary of segment {i}."} for i in ids]})
+    return "Summary of the code."
+
+
+class FakeOpenAI:
+    """Synchronous OpenAI stand-in answering every completion after a fixed latency."""
+    def __init__(self, latency, counter):
+        fake = self
+
+        class Completions:
+            def create(self, model=None, messages=None, response_format=None, **kwargs):
+                counter["calls"] += 1
+                time.sleep(fake.latency)
+                return _Response(fake_completion(messages, response_format))
+
+        self.latency = latency
+        self.chat = type("Chat", (), {"completions": Completions()})()
+
+
+class FakeAsyncOpenAI:
+    """AsyncOpenAI stand-in answering every completion after a fixed latency."""
+    def __init__(self, latency, counter):
+        fake = self
+
+        class Completions:
+            async def create(self, model=None, messages=None, response_format=None, **kwargs):
+                counter["calls"] += 1
+                await asyncio.sleep(fake.latency)
+                return _Response(fake_completion(messages, response_format))
+
+        self.latency = latency
+        self.chat = type("Chat", (), {"completions": Completions()})()
+
+    async def close(self):
+        pass
+
+
+def touch_files(repo_dir, fraction, seed=1):
+    """Append a function to a fraction of the repository files and return how many were changed."""
+    paths = sorted(
+        os.path.join(root, file) for root, _, files in os.walk(repo_dir) for file in files if file.endswith(".py")
+    )
+    changed = random.Random(seed).sample(paths, max(1, int(len(paths) * fraction)))
+    for path in changed:
+        with open(path, "a", encoding="utf-8") as f:
+            f.write("\n\ndef added_by_benchmark():\n    return 42\n")
+    return len(changed)
+
+
+def run_mode(mode, repo_dir, work_dir, config, queue):
+    """Child process: run one mode and put its metrics on the queue."""
+    try:
+        import code_parsing
+        import summary_cache
+
+        counter = {"calls": 0}
+        code_parsing._openai_client = FakeOpenAI(config["latency"], counter)
+        code_parsing.make_async_openai_client = lambda: FakeAsyncOpenAI(config["latency"], counter)
+        os.environ["MODEL_NAME"] = "benchmark-model"
+        os.environ["SUMMARY_CACHE_PATH"] = os.path.join(work_dir, "summary_cache.db") if mode == "cached" else ""
+        summary_cache._summary_cache = None
+
+        includes = ["folders", "files", "functions", "classes", "methods", "inline_code"]
+        if mode == "graph_sqlite":
+            includes.append("relationships")
+        output_file = os.path.join(work_dir, "code_parser.jsonl" if mode == "stream" else "code_parser.json")
+        options = {"workers": 1}
+        if mode == "parallel":
+            options["workers"] = config["workers"]
+        elif mode == "async_summaries":
+            options["summary_concurrency"] = config["concurrency"]
+        elif mode == "batched":
+            options["summary_concurrency"] = config["concurrency"]
+            options["summary_batch_tokens"] = config["batch_tokens"]
+        elif mode == "stream":
+            options["stream"] = True
+        elif mode == "compact":
+            options["compact"] = True
+        elif mode == "incremental":
+            options["incremental"] = True
+
+        def extract():
+            return code_parsing.extract_hierarchy_with_code(
+                repo_dir, [".py"], includes, output_file, config["summary_flag"], **options
+            )
+
+        devnull = open(os.devnull, "w")
+        stdout = sys.stdout
+        sys.stdout = devnull
+        try:
+            # Warm-up run for modes that measure a second pass over a mostly unchanged repo
+            changed = None
+            if mode == "graph_sqlite":
+                extract()
+                metrics = benchmark_graph_load(output_file, work_dir, config)
+                metrics["mode"] = mode
+                metrics["llm_calls"] = counter["calls"]
+                metrics["peak_rss_mb"] = round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+                queue.put(metrics)
+                return
+            if mode in ("cached", "incremental"):
+                extract()
+                if mode == "incremental":
+                    changed = touch_files(repo_dir, config["changed_fraction"])
+                counter["calls"] = 0
+            start = time.perf_counter()
+            result = extract()
+            elapsed = time.perf_counter() - start
+        finally:
+            sys.stdout = stdout
+            devnull.close()
+
+        entities = result if isinstance(result, int) else len(result)
+        metrics = {
+            "mode": mode,
+            "options": options,
+            "seconds": round(elapsed, 4),
+            "files": config["files"],
+            "entities": entities,
+            "files_per_sec": round(config["files"] / elapsed, 2) if elapsed else None,
+            "entities_per_sec": round(entities / elapsed, 2) if elapsed else None,
+            "llm_calls": counter["calls"],
+            "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+            "peak_rss_children_mb": round(resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024, 1),
+            "output_bytes": os.path.getsize(output_file) if os.path.exists(output_file) else None,
+        }
+        if changed is not None:
+            metrics["changed_files"] = changed
+        queue.put(metrics)
+    except Exception as e:
+        queue.put({"mode": mode, "error": repr(e)})
+
+
+def benchmark_graph_load(output_file, work_dir, config):
+    """Load parser output into the SQLite graph backend and time it and each query template."""
+    import code_parsing
+    from graph_backend import SQLiteGraphBackend, CYPHER_TEMPLATES
+
+    backend = SQLiteGraphBackend(os.path.join(work_dir, "code_graph.db"))
+    try:
+        start = time.perf_counter()
+        backend.load(code_parsing.read_entities(output_file))
+        elapsed = time.perf_counter() - start
+        nodes = backend.conn.execute("SELECT COUNT(*) FROM nodes").fetchone()[0]
+        edges = backend.conn.execute("SELECT COUNT(*) FROM edges").fetchone()[0]
+        params = {
+            "file_code": {"file_name": "module_0.py"},
+            "class_methods": {"class_name": "Model_0_0"},
+            "callers": {"function_name": "helper_0"},
+            "file_imports": {"file_name": "module_0.py"},
+        }
+        queries = {}
+        for name in CYPHER_TEMPLATES:
+            start_query = time.perf_counter()
+            rows = backend.run_template(name, **params.get(name, {}))
+            queries[name] = {"ms": round((time.perf_counter() - start_query) * 1000, 3), "rows": len(rows)}
+    finally:
+        backend.close()
+    return {
+        "seconds": round(elapsed, 4),
+        "files": config["files"],
+        "entities": nodes,
+        "edges": edges,
+        "files_per_sec": round(config["files"] / elapsed, 2) if elapsed else None,
+        "entities_per_sec": round(nodes / elapsed, 2) if elapsed else None,
+        "queries": queries,
+    }
+
+
+def benchmark(config, modes):
+    results = []
+    base_dir = tempfile.mkdtemp(prefix="code_parsing_bench_")
+    try:
+        template_dir = os.path.join(base_dir, "template")
+        generate_synthetic_repo(template_dir, config["files"], config["classes"], config["methods"],
+                                config["functions"], seed=config["seed"])
+        context = multiprocessing.get_context("spawn")
+        for mode in modes:
+            # Every mode gets its own copy of the repo and output directory, and a fresh process for RSS
+            repo_dir = os.path.join(base_dir, mode, "repo")
+            work_dir = os.path.join(base_dir, mode, "out")
+            shutil.copytree(template_dir, repo_dir)
+            os.makedirs(work_dir)
+            queue = context.Queue()
+            process = context.Process(target=run_mode, args=(mode, repo_dir, work_dir, config, queue))
+            process.start()
+            metrics = queue.get()
+            process.join()
+            print(json.dumps(metrics))
+            results.append(metrics)
+    finally:
+        shutil.rmtree(base_dir, ignore_errors=True)
+    return results
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "HEAD"], cwd=os.path.dirname(os.path.abspath(__file__)),
+            stderr=subprocess.DEVNULL, text=True
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results, baseline_file):
+    """Print per-mode timing ratios against a previous results file (>1.0 means slower now)."""
+    with open(baseline_file, "r", encoding="utf-8") as f:
+        baseline = {item["mode"]: item for item in json.load(f)["results"]}
+    for item in results:
+        previous = baseline.get(item["mode"])
+        if not previous or "seconds" not in previous or "seconds" not in item:
+            continue
+        ratio = item["seconds"] / previous["seconds"] if previous["seconds"] else float("inf")
+        print(f"{item['mode']:>16}: {previous['seconds']:.3f}s -> {item['seconds']:.3f}s ({ratio:.2f}x), "
+              f"llm calls {previous.get('llm_calls')} -> {item.get('llm_calls')}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the code parsing and summarization pipeline.")
+    parser.add_argument("--files", type=int, default=200)
+    parser.add_argument("--classes", type=int, default=2, help="classes per file")
+    parser.add_argument("--methods", type=int, default=4, help="methods per class")
+    parser.add_argument("--functions", type=int, default=3, help="top-level functions per file")
+    parser.add_argument("--latency", type=float, default=0.01, help="fake LLM latency in seconds")
+    parser.add_argument("--no-summary", action="store_true", help="benchmark parsing only")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 2)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--batch-tokens", type=int, default=2000)
+    parser.add_argument("--changed-fraction", type=float, default=0.02)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--modes", default=",".join(MODES), help="comma separated subset of " + ",".join(MODES))
+    parser.add_argument("--output", default="benchmark_results.json")
+    parser.add_argument("--compare", help="previous results file to compare against")
+    args = parser.parse_args()
+
+    modes = [mode.strip() for mode in args.modes.split(",") if mode.strip()]
+    unknown = set(modes) - set(MODES)
+    if unknown:
+        parser.error(f"unknown modes: {', '.join(sorted(unknown))}")
+    config = {
+        "files": args.files,
+        "classes": args.classes,
+        "methods": args.methods,
+        "functions": args.functions,
+        "latency": args.latency,
+        "summary_flag": "False" if args.no_summary else "True",
+        "workers": args.workers,
+        "concurrency": args.concurrency,
+        "batch_tokens": args.batch_tokens,
+        "changed_fraction": args.changed_fraction,
+        "seed": args.seed,
+    }
+    results = benchmark(config, modes)
+    report = {
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "timestamp": time.time(),
+        "config": config,
+        "results": results,
+    }
+    if args.compare:
+        compare(results, args.compare)
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=4)
+    print(f"Results saved to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
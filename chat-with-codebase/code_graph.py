@@ -0,0 +1,273 @@
+import os
+import ast
+
+
+def call_name(node):
+    """Dotted name of a call target (foo, self.bar, os.path.join), or None for dynamic targets."""
+    parts = []
+    while isinstance(node, ast.Attribute):
+        parts.append(node.attr)
+        node = node.value
+    if not isinstance(node, ast.Name):
+        return None
+    parts.append(node.id)
+    return ".".join(reversed(parts))
+
+
+def collect_calls(node):
+    """Distinct call names inside a function body, in source order."""
+    calls = []
+    seen = set()
+    for child in ast.walk(node):
+        if isinstance(child, ast.Call):
+            name = call_name(child.func)
+            if name and name not in seen:
+                seen.add(name)
+                calls.append(name)
+    return calls
+
+
+def module_name(path, root_path):
+    """Dotted module name of a file relative to the parsed root (pkg/mod.py -> pkg.mod, pkg/__init__.py -> pkg)."""
+    base, _ = os.path.splitext(os.path.relpath(path, root_path))
+    parts = [part for part in base.split(os.sep) if part not in ("", ".", "..")]
+    if parts and parts[-1] == "__init__":
+        parts = parts[:-1]
+    return ".".join(parts)
+
+
+def common_prefix_length(a, b):
+    return len(os.path.commonprefix([a, b]))
+
+
+def entity_id(entity_type, path, qualified_name=None):
+    """Stable node id: entity type, file (or folder) path and the qualified name inside the file (Class.method)."""
+    return ":".join(part for part in (entity_type, path, qualified_name) if part)
+
+
+def assign_entity_ids(entities):
+    """
+    Give entities an "id" and "parent_id" (see entity_id), resolving each parent in memory from the entities
+    seen before it: the folder of a file is its directory, file-level entities hang off their file, and code /
+    summary entities follow the function, class or method they belong to. Functions, classes and methods use
+    the qualified_name recorded by the parser (enclosing classes and functions, so same-named methods of
+    different classes get different ids), falling back to the name. Entities that already have an id,
+    relationship records and pathless inline "code" entries are passed through unchanged.
+    """
+    known = {}  # (type, path, name) -> qualified name of the last entity seen with that key
+    for entity in entities:
+        entity_type = entity.get("type")
+        path = entity.get("path")
+        if entity_type == "relationship" or path is None or "id" in entity:
+            yield entity
+            continue
+        name = entity.get("name")
+        parent_type = entity.get("parent_type")
+        parent_qualified = known.get((parent_type, path, entity.get("parent_name")))
+        if entity_type in ("folder", "file", "file_code") or (entity_type == "summary" and parent_type == "file"):
+            qualified = None
+        elif entity.get("qualified_name"):
+            qualified = entity["qualified_name"]
+        elif entity_type == "method":
+            qualified = f"{parent_qualified or entity.get('parent_name')}.{name}"
+        elif entity_type.endswith("_code") or entity_type == "summary":
+            qualified = parent_qualified or entity.get("parent_name")
+        else:
+            qualified = name
+        known[(entity_type, path, name)] = qualified
+
+        if parent_type == "folder":
+            parent_id = entity_id("folder", os.path.dirname(path))
+        elif parent_type == "file":
+            parent_id = entity_id("file", path)
+        elif parent_type:
+            parent_id = entity_id(parent_type, path, parent_qualified or entity.get("parent_name"))
+        else:
+            parent_id = None
+        entity["id"] = entity_id(entity_type, path, qualified)
+        entity["parent_id"] = parent_id
+        yield entity
+
+
+class CodeGraphIndex:
+    """
+    Collects symbols, import records and raw call names from parsed entities and resolves them into
+    IMPORTS and CALLS relationship records once every file has been seen. Only names are kept, so
+    the index stays small while entities are streamed. Symbols are (type, name, path, qualified name)
+    tuples; the qualified name (Class.method) makes up the entity id of either end of an edge.
+    """
+    def __init__(self, root_path):
+        self.root_path = root_path
+        self.file_modules = {}   # file path -> dotted module name
+        self.file_imports = {}   # file path -> import records of the file entity
+        self.functions = {}      # file path -> module-level function names
+        self.classes = {}        # file path -> module-level class names
+        self.methods = {}        # (file path, qualified class name) -> method names
+        self.callers = []        # (type, name, path, qualified class name, qualified name, call names)
+
+    def add(self, entity):
+        entity_type = entity.get("type")
+        path = entity.get("path")
+        name = entity.get("name")
+        if entity_type == "file":
+            self.file_modules[path] = module_name(path, self.root_path)
+            self.file_imports[path] = entity.get("imports") or []
+        elif entity_type == "function":
+            qualified = entity.get("qualified_name") or name
+            # Nested defs (and the parser's function records of methods) are not reachable by a bare call
+            if qualified == name:
+                self.functions.setdefault(path, set()).add(name)
+            if entity.get("calls"):
+                self.callers.append(("function", name, path, None, qualified, entity["calls"]))
+        elif entity_type == "class":
+            if (entity.get("qualified_name") or name) == name:
+                self.classes.setdefault(path, set()).add(name)
+        elif entity_type == "method":
+            qualified = entity.get("qualified_name") or f"{entity.get('parent_name')}.{name}"
+            class_name = qualified.rsplit(".", 1)[0]
+            self.methods.setdefault((path, class_name), set()).add(name)
+            if entity.get("calls"):
+                self.callers.append(("method", name, path, class_name, qualified, entity["calls"]))
+
+    def relationships(self):
+        """Yield resolved IMPORTS and CALLS relationship records."""
+        modules = {}
+        for path, name in self.file_modules.items():
+            # Index every dotted suffix so imports resolve regardless of which folder is the source root
+            parts = name.split(".")
+            for i in range(len(parts)):
+                modules.setdefault(".".join(parts[i:]), []).append(path)
+        self.modules = modules
+
+        bindings = {path: self.import_bindings(path) for path in self.file_imports}
+        seen = set()
+
+        for path, records in self.file_imports.items():
+            for record in records:
+                target_path = self.find_module(self.absolute_module(record, path), path)
+                if record.get("type") == "from_import":
+                    submodule = self.find_module(
+                        ".".join(filter(None, [self.absolute_module(record, path), record.get("name")])), path
+                    )
+                    symbol = self.find_symbol(target_path, record.get("name"))
+                    if submodule:
+                        target_path, symbol = submodule, None
+                    if symbol:
+                        yield from self.emit(seen, "IMPORTS", ("file", os.path.basename(path), path, None), symbol)
+                if target_path and target_path != path:
+                    target = ("file", os.path.basename(target_path), target_path, None)
+                    yield from self.emit(seen, "IMPORTS", ("file", os.path.basename(path), path, None), target)
+
+        for caller_type, name, path, class_name, qualified, calls in self.callers:
+            for call in calls:
+                target = self.resolve_call(call, path, class_name, bindings.get(path, {}))
+                if target:
+                    yield from self.emit(seen, "CALLS", (caller_type, name, path, qualified), target)
+
+    def emit(self, seen, relationship, source, target):
+        key = (relationship, source, target)
+        if key in seen:
+            return
+        seen.add(key)
+        yield {
+            "type": "relationship",
+            "relationship": relationship,
+            "source_type": source[0],
+            "source_name": source[1],
+            "source_path": source[2],
+            "target_type": target[0],
+            "target_name": target[1],
+            "target_path": target[2],
+            "source_id": entity_id(source[0], source[2], source[3]),
+            "target_id": entity_id(target[0], target[2], target[3]),
+        }
+
+    def absolute_module(self, record, path):
+        """Module named by an import record, with relative (from . import x) imports made absolute."""
+        level = record.get("level") or 0
+        if not level:
+            return record.get("module")
+        package = self.file_modules.get(path, "").split(".")
+        if not os.path.basename(path).startswith("__init__."):
+            package = package[:-1]
+        if level > 1:
+            package = package[:-(level - 1)] if level - 1 < len(package) else []
+        return ".".join(filter(None, package + [record.get("module")]))
+
+    def find_module(self, name, from_path):
+        """File for a dotted module name; among several matches prefer the one closest to the importer."""
+        if not name:
+            return None
+        candidates = self.modules.get(name)
+        if not candidates:
+            return None
+        return max(candidates, key=lambda candidate: common_prefix_length(candidate, from_path))
+
+    def find_symbol(self, module_path, name):
+        if module_path is None or name is None:
+            return None
+        if name in self.functions.get(module_path, ()):
+            return ("function", name, module_path, name)
+        if name in self.classes.get(module_path, ()):
+            return ("class", name, module_path, name)
+        return None
+
+    def import_bindings(self, path):
+        """Local name -> ("module", file) or ("symbol", (type, name, file, qualified name)) for the imports of one file."""
+        bindings = {}
+        for record in self.file_imports.get(path, []):
+            module = self.absolute_module(record, path)
+            if record.get("type") == "import":
+                module_path = self.find_module(module, path)
+                if module_path is None:
+                    continue
+                if record.get("as"):
+                    bindings[record["as"]] = ("module", module_path)
+                else:
+                    bindings[module] = ("module", module_path)
+            else:
+                local = record.get("as") or record.get("name")
+                submodule = self.find_module(".".join(filter(None, [module, record.get("name")])), path)
+                if submodule:
+                    bindings[local] = ("module", submodule)
+                    continue
+                symbol = self.find_symbol(self.find_module(module, path), record.get("name"))
+                if symbol:
+                    bindings[local] = ("symbol", symbol)
+        return bindings
+
+    def resolve_call(self, call, path, class_name, bindings):
+        parts = call.split(".")
+        if len(parts) == 1:
+            name = parts[0]
+            if name in self.functions.get(path, ()):
+                return ("function", name, path, name)
+            if name in self.classes.get(path, ()):
+                return ("class", name, path, name)
+            binding = bindings.get(name)
+            return binding[1] if binding and binding[0] == "symbol" else None
+
+        if parts[0] in ("self", "cls") and class_name and len(parts) == 2:
+            if parts[1] in self.methods.get((path, class_name), ()):
+                return ("method", parts[1], path, f"{class_name}.{parts[1]}")
+            return None
+        if len(parts) == 2 and parts[0] in self.classes.get(path, ()):
+            if parts[1] in self.methods.get((path, parts[0]), ()):
+                return ("method", parts[1], path, call)
+
+        for i in range(len(parts) - 1, 0, -1):
+            binding = bindings.get(".".join(parts[:i]))
+            if binding is None:
+                continue
+            rest = parts[i:]
+            if binding[0] == "module":
+                if len(rest) == 1:
+                    return self.find_symbol(binding[1], rest[0])
+                if len(rest) == 2 and rest[1] in self.methods.get((binding[1], rest[0]), ()):
+                    return ("method", rest[1], binding[1], ".".join(rest))
+            elif binding[1][0] == "class" and len(rest) == 1:
+                symbol_path = binding[1][2]
+                if rest[0] in self.methods.get((symbol_path, binding[1][1]), ()):
+                    return ("method", rest[0], symbol_path, f"{binding[1][1]}.{rest[0]}")
+            return None
+        return None
@@ -1,17 +1,38 @@
 import os
 import json
 import ast
-from openai import OpenAI
+import hashlib
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from openai import OpenAI, AsyncOpenAI
+from summary_cache import SummaryCache, get_summary_cache
+from summarizer import run_summary_requests
+from code_store import CodeStore, line_byte_offsets, make_code_ref, make_lines_ref
+from code_graph import CodeGraphIndex, collect_calls, entity_id, assign_entity_ids
+
+# Files parsed and summarized per step when streaming JSONL output
+STREAM_WINDOW_FILES = 64
+# Upper bound on files sent to a parse worker at once
+PARSE_CHUNK_SIZE = 32
 
 class CodeAnalyzer(ast.NodeVisitor):
     """
     Custom AST visitor to extract imports, functions, and classes with inline code.
+    Functions and methods also record the names they call, for CALLS edges.
+    Every def and class records its qualified_name, the dotted path of enclosing classes and functions
+    (Class.method, outer.inner), which makes up its entity id.
+    In compact mode entities carry a code_ref (line and byte range in the file) instead of the code text.
     """
-    def __init__(self, code):
+    def __init__(self, code, compact=False):
         self.code = code.splitlines()  # Split code into lines for extracting specific segments
+        self.compact = compact
+        if compact:
+            self.source_bytes = code.encode('utf-8')
+            self.line_starts = line_byte_offsets(self.source_bytes)
         self.imports = []
         self.functions = []
         self.classes = []
+        self.scope = []  # names of the enclosing classes and functions
 
     def get_code_segment(self, node):
         """Extracts code corresponding to an AST node."""
@@ -19,13 +40,19 @@ class CodeAnalyzer(ast.NodeVisitor):
         end = node.end_lineno
         return "\n".join(self.code[start:end])
 
+    def get_code_fields(self, node):
+        """{"code": segment}, or {"code_ref": offsets} in compact mode."""
+        if self.compact:
+            return {"code_ref": make_code_ref(self.line_starts, self.source_bytes, node.lineno, node.end_lineno)}
+        return {"code": self.get_code_segment(node)}
+
     def visit_Import(self, node):
         for alias in node.names:
             self.imports.append({
                 "type": "import",
                 "module": alias.name,
                 "as": alias.asname,
-                "code": self.get_code_segment(node)
+                **self.get_code_fields(node)
             })
         self.generic_visit(node)
 
@@ -37,58 +64,97 @@ class CodeAnalyzer(ast.NodeVisitor):
                 "module": module,
                 "name": alias.name,
                 "as": alias.asname,
-                "code": self.get_code_segment(node)
+                "level": node.level,
+                **self.get_code_fields(node)
             })
         self.generic_visit(node)
 
+    def qualified_name(self, name):
+        return ".".join(self.scope + [name])
+
     def visit_FunctionDef(self, node):
         self.functions.append({
             "type": "function",
             "name": node.name,
+            "qualified_name": self.qualified_name(node.name),
             "args": [arg.arg for arg in node.args.args],
             "docstring": ast.get_docstring(node),
-            "code": self.get_code_segment(node)
+            "calls": collect_calls(node),
+            **self.get_code_fields(node)
         })
+        self.scope.append(node.name)
         self.generic_visit(node)
+        self.scope.pop()
 
     def visit_ClassDef(self, node):
+        qualified = self.qualified_name(node.name)
         methods = []
         for item in node.body:
             if isinstance(item, ast.FunctionDef):
                 methods.append({
                     "type": "method",
                     "name": item.name,
+                    "qualified_name": f"{qualified}.{item.name}",
                     "args": [arg.arg for arg in item.args.args],
                     "docstring": ast.get_docstring(item),
-                    "code": self.get_code_segment(item)
+                    "calls": collect_calls(item),
+                    **self.get_code_fields(item)
                 })
         self.classes.append({
             "type": "class",
             "name": node.name,
+            "qualified_name": qualified,
             "docstring": ast.get_docstring(node),
             "methods": methods,
-            "code": self.get_code_segment(node)
+            **self.get_code_fields(node)
         })
+        self.scope.append(node.name)
         self.generic_visit(node)
+        self.scope.pop()
 
 
-def parse_code(file_path):
+def segment_line_count(item):
+    if "code_ref" in item:
+        return sum(end_line - start_line + 1 for start_line, end_line, _, _ in item["code_ref"])
+    return item["code"].count("\n") + 1
+
+
+def parse_code(file_path, compact=False):
     """
     Parse the given Python file and extract entities using AST.
+    With compact=True code segments are returned as code_ref offsets into the file.
     """
     try:
-        with open(file_path, 'r', encoding='utf-8') as f:
-            code = f.read()
+        if compact:
+            # Keep the original line endings so byte offsets match the file on disk
+            with open(file_path, 'rb') as f:
+                code = f.read().decode('utf-8')
+        else:
+            with open(file_path, 'r', encoding='utf-8') as f:
+                code = f.read()
         tree = ast.parse(code)
-        analyzer = CodeAnalyzer(code)
+        analyzer = CodeAnalyzer(code, compact=compact)
         analyzer.visit(tree)
 
         # Extract remaining inline code (outside of functions/classes)
         used_lines = set(
             line
             for item in analyzer.imports + analyzer.functions + analyzer.classes
-            for line in range(item["code"].count("\n") + 1)
+            for line in range(segment_line_count(item))
         )
+        if compact:
+            inline_ref = make_lines_ref(
+                analyzer.line_starts, analyzer.source_bytes,
+                [i + 1 for i in range(len(analyzer.code)) if i not in used_lines],
+                strip=True
+            )
+            return {
+                "imports": analyzer.imports,
+                "functions": analyzer.functions,
+                "classes": analyzer.classes,
+                "inline_code": None,
+                "inline_code_ref": inline_ref or None
+            }
         inline_code = "\n".join(
             line for i, line in enumerate(code.splitlines()) if i not in used_lines
         )
@@ -104,207 +170,572 @@ def parse_code(file_path):
         return {"imports": [], "functions": [], "classes": [], "inline_code": None}
 
 
-def extract_hierarchy_with_code(root_path, allowed_extensions, include_levels, output_file, summary_flag):
+def parse_files(file_paths, workers=1, executor=None, compact=False, progress=None):
     """
-    Traverse the directory and extract a flat structure with code and relationships.
+    Parse the given files, fanning the work out across a process pool when workers > 1.
+    An existing executor can be passed to reuse one pool across calls.
+    Results are returned in the same order as file_paths; progress("files_parsed") is called per file.
+    """
+    if workers is None or workers <= 0:
+        workers = os.cpu_count() or 1
+    parse = partial(parse_code, compact=compact)
+    if workers == 1 or len(file_paths) < 2:
+        return collect_parsed(map(parse, file_paths), progress)
+
+    # Bounded chunks keep cancellation prompt: only queued chunks can be dropped, started ones run to the end
+    chunksize = max(1, min(PARSE_CHUNK_SIZE, len(file_paths) // (workers * 4)))
+    if executor is not None:
+        return collect_parsed(executor.map(parse, file_paths, chunksize=chunksize), progress)
+    executor = ProcessPoolExecutor(max_workers=workers)
+    try:
+        return collect_parsed(executor.map(parse, file_paths, chunksize=chunksize), progress)
+    finally:
+        # On cancellation (progress raising) drop the queued files instead of parsing them all first
+        executor.shutdown(cancel_futures=True)
+
+
+def collect_parsed(results, progress=None):
+    parsed = []
+    for result in results:
+        parsed.append(result)
+        if progress:
+            progress("files_parsed")
+    return parsed
+
+
+def entity_code_fields(item):
+    """Code of a parsed item as stored on an entity: the text, or its code_ref in compact mode."""
+    if "code_ref" in item:
+        return {"code_ref": item["code_ref"]}
+    return {"code": item["code"]}
+
+
+def item_source(item, file_path, code_store):
+    """Code text of a parsed item, read through the code store in compact mode."""
+    if "code_ref" in item:
+        return code_store.read(file_path, item["code_ref"])
+    return item["code"]
+
+
+def build_file_entities(root, file, code_entities, include_levels, summary_jobs, code_store=None, content_hash=None):
+    """
+    Build the flat list of entities (file, code, summary, functions, classes, methods) for one parsed file.
+    Every entity with a path gets a stable id and the id of its parent (see code_graph.assign_entity_ids).
+    Summaries are left empty; an (entity, source_code) pair is appended to summary_jobs for each one
+    so they can be generated by the summarization stage after the AST pass (None when summaries are off).
+    code_store is used to read the source of compact (code_ref) items for summarization.
+    content_hash (SHA-256 of the file) is stored on the file entity so graph sync can detect changed files.
     """
-    root_path = os.path.normpath(root_path)
     output_data = []
-    print(include_levels)
-    for root, _, files in os.walk(root_path):
-        # Add folder details (Folders do not have code)
-        if "folders" in include_levels:
-            folder_name = os.path.basename(root)
-            parent_folder = os.path.dirname(root) if root != root_path else None
-            print(parent_folder)
+    file_path = os.path.join(root, file)
+    file_parent = root
+    inline_code = code_entities.get("inline_code")
+    inline_ref = code_entities.get("inline_code_ref")
+    inline_item = {"code_ref": inline_ref} if inline_ref else {"code": inline_code}
+
+    # Initialize a place to store imports by file
+    file_imports = {}
+
+    # Collect imports and group by file
+    if "imports" in include_levels:
+        if file not in file_imports:
+            file_imports[file] = []
+        file_imports[file].extend(code_entities["imports"])
+
+    # Add file details (files may have inline code)
+    if "files" in include_levels:
+        file_entity = {
+            "type": "file",
+            "name": file,
+            "path": file_path,
+            "parent_name": os.path.basename(file_parent),
+            "parent_type": "folder",
+            "content_hash": content_hash,
+        }
+        if "relationships" in include_levels:
+            # Raw import records, resolved into IMPORTS edges once every file is known
+            file_entity["imports"] = [
+                {key: imp.get(key) for key in ("type", "module", "name", "as", "level")}
+                for imp in code_entities["imports"]
+            ]
+        output_data.append(file_entity)
+        output_data.append({
+            "type": "file_code",
+            "name": "code-" + file,
+            "path": file_path,
+            "parent_name": file,
+            "parent_type": "file",
+            **entity_code_fields(inline_item),  # Include inline code directly under file
+
+        })
+        file_summary = {
+            "type": "summary",
+            "name": "summary-" + file,
+            "path": file_path,
+            "parent_name": file,
+            "parent_type": "file",
+            "code_summary" : None
+        }
+        output_data.append(file_summary)
+        if summary_jobs is not None:
+            summary_jobs.append((file_summary, item_source(inline_item, file_path, code_store)))
+
+
+    # Add imports grouped by file
+    if file in file_imports:
+        for imp in file_imports[file]:
             output_data.append({
-                "type": "folder",
-                "name": folder_name,
-                "path": root,
-                "parent_name": None,  # Folder has no parent name
-                "parent_type": None,  # Folder has no parent type
-                "code": None
+                "type": imp["type"],
+                "name": imp["module"] if imp["type"] == "import" else imp["name"],
+                "path": file_path,
+                "parent_name": file,
+                "parent_type": "file",
+                **entity_code_fields(imp)
             })
 
-        # Initialize a place to store imports by file
-        file_imports = {}
+    # Add functions
+    if "functions" in include_levels:
+        for func in code_entities["functions"]:
+            func_entity = {
+                "type": "function",
+                "name": func["name"],
+                "qualified_name": func.get("qualified_name"),
+                "path": file_path,
+                "parent_name": file,
+                "parent_type": "file",
+                "docstring": func.get("docstring"),
+            }
+            if "relationships" in include_levels:
+                func_entity["calls"] = func.get("calls", [])
+            output_data.append(func_entity)
+            output_data.append({
+            "type": "function_code",
+            "name": "code-" + func["name"],
+            "path": file_path,
+            "parent_name": func["name"],
+            "parent_type": "function",
+            **entity_code_fields(func),
+
+            })
+            func_summary = {
+            "type": "summary",
+            "name": "summary-" + func["name"],
+            "path": file_path,
+            "parent_name": func["name"],
+            "parent_type": "function",
 
-        for file in files:
-            if any(file.endswith(ext) for ext in allowed_extensions):
-                file_path = os.path.join(root, file)
-                file_parent = root
+            "code_summary" : None
+            }
+            output_data.append(func_summary)
+            if summary_jobs is not None:
+                summary_jobs.append((func_summary, item_source(func, file_path, code_store)))
 
-                # Extract code entities if detailed analysis is included
-                code_entities = parse_code(file_path)
-                inline_code = code_entities.get("inline_code")
-                
-                # Collect imports and group by file
-                if "imports" in include_levels:
-                    if file not in file_imports:
-                        file_imports[file] = []
-                    file_imports[file].extend(code_entities["imports"])
-                    
-                # Add file details (files may have inline code)
-                if "files" in include_levels:
-                    file_summary =  generate_code_summary(inline_code,summary_flag)
-                    output_data.append({
-                        "type": "file",
-                        "name": file,
-                        "path": file_path,
-                        "parent_name": os.path.basename(file_parent),
-                        "parent_type": "folder",
-                    })
-                    output_data.append({
-                        "type": "file_code",
-                        "name": "code-" + file,
-                        "path": file_path,
-                        "parent_name": file,
-                        "parent_type": "file",
-                        "code": inline_code,  # Include inline code directly under file
-    
-                    })
-                    output_data.append({
-                        "type": "summary",
-                        "name": "summary-" + file,
-                        "path": file_path,
-                        "parent_name": file,
-                        "parent_type": "file",
-                        "code_summary" : file_summary
-                    })
-                    
-
-                # Add imports grouped by file
-                if file in file_imports:
-                    for imp in file_imports[file]:
-                        output_data.append({
-                            "type": imp["type"],
-                            "name": imp["module"] if imp["type"] == "import" else imp["name"],
-                            "path": file_path,
-                            "parent_name": file,
-                            "parent_type": "file",
-                            "code": imp["code"]
-                        })
-
-                # Add functions
-                if "functions" in include_levels:
-                    for func in code_entities["functions"]:
-                        func_summary =  generate_code_summary(func["code"],summary_flag)
-                        output_data.append({
-                            "type": "function",
-                            "name": func["name"],
-                            "path": file_path,
-                            "parent_name": file,
-                            "parent_type": "file",
-                            "docstring": func.get("docstring"),
-                        })
-                        output_data.append({
-                        "type": "function_code",
-                        "name": "code-" + func["name"],
+    # Add classes
+    if "classes" in include_levels:
+        for cls in code_entities["classes"]:
+            output_data.append({
+                "type": "class",
+                "name": cls["name"],
+                "qualified_name": cls.get("qualified_name"),
+                "path": file_path,
+                "parent_name": file,
+                "parent_type": "file",
+               # "code": cls["code"],
+                "docstring": cls.get("docstring"),
+                #"code_summary" : generate_code_summary(cls["code"],summary_flag)
+            })
+            output_data.append({
+                "type": "class_code",
+                "name": "code-" + cls["name"],
+                "path": file_path,
+                "parent_name": cls["name"],
+                "parent_type": "class",
+                **entity_code_fields(cls),
+                "docstring": cls.get("docstring"),
+            })
+            cls_summary = {
+                "type": "summary",
+                "name": "summary-" + cls["name"],
+                "path": file_path,
+                "parent_name": cls["name"],
+                "parent_type": "class",
+
+                "code_summary" : None
+            }
+            output_data.append(cls_summary)
+            if summary_jobs is not None:
+                summary_jobs.append((cls_summary, item_source(cls, file_path, code_store)))
+            # Add methods within classes
+            if "methods" in include_levels:
+                for method in cls["methods"]:
+                    method_entity = {
+                        "type": "method",
+                        "name": method["name"],
+                        "qualified_name": method.get("qualified_name"),
                         "path": file_path,
-                        "parent_name": func["name"],
-                        "parent_type": "function",
-                        "code": func["code"],  
-                       
-                        })
-                        output_data.append({
-                        "type": "summary",
-                        "name": "summary-" + func["name"],
+                        "parent_name": cls["name"],
+                        "parent_type": "class",
+                        **entity_code_fields(method),
+                        "docstring": method.get("docstring"),
+
+                    }
+                    if "relationships" in include_levels:
+                        method_entity["calls"] = method.get("calls", [])
+                    output_data.append(method_entity)
+                    method_summary = {
+                        "type": "method_code",
+                        "name": "code-" + method["name"],
                         "path": file_path,
-                        "parent_name": func["name"],
-                        "parent_type": "function",
-                        
-                        "code_summary" : func_summary
-                        })
-                    
-               
-                if "imports" in include_levels and file in file_imports:
-                    for imp in file_imports[file]:
-                        output_data.append({
-                            "type": imp["type"],
-                            "name": imp["module"] if imp["type"] == "import" else imp["name"],
-                            "path": file_path,
-                            "parent_name": file,
-                            "parent_type": "file",
-                            "code": imp["code"]
-                        })
-                
-                # Add classes
-                if "classes" in include_levels:
-                    for cls in code_entities["classes"]:
-                        output_data.append({
-                            "type": "class",
-                            "name": cls["name"],
-                            "path": file_path,
-                            "parent_name": file,
-                            "parent_type": "file",
-                           # "code": cls["code"],
-                            "docstring": cls.get("docstring"),
-                            #"code_summary" : generate_code_summary(cls["code"],summary_flag)
-                        })
-                        output_data.append({
-                            "type": "class_code",
-                            "name": "code-" + cls["name"],
-                            "path": file_path,
-                            "parent_name": cls["name"],
-                            "parent_type": "class",
-                            "code": cls["code"],
-                            "docstring": cls.get("docstring"),
-                        })
-                        output_data.append({
-                            "type": "summary",
-                            "name": "summary-" + cls["name"],
-                            "path": file_path,
-                            "parent_name": cls["name"],
-                            "parent_type": "class",
-                            
-                            "code_summary" : generate_code_summary(cls["code"],summary_flag)
-                        })
-                        # Add methods within classes
-                        if "methods" in include_levels:
-                            for method in cls["methods"]:
-                                output_data.append({
-                                    "type": "method",
-                                    "name": method["name"],
-                                    "path": file_path,
-                                    "parent_name": cls["name"],
-                                    "parent_type": "class",
-                                    "code": method["code"],
-                                    "docstring": method.get("docstring"),
-                                   
-                                })
-                                output_data.append({
-                                    "type": "method_code",
-                                    "name": "code-" + method["name"],
-                                    "path": file_path,
-                                    "parent_name": method["name"],
-                                    "parent_type": "method",
-                                    
-                                    "code_summary" : generate_code_summary(method["code"],summary_flag)
-                                })
-
-                # Add code (if code exists outside functions/classes)
-                if inline_code:
-                    output_data.append({
-                        "type": "code",
-                        "name": file,
-                        "parent_name": file,
-                        "parent_type": "file",
-                        "code": inline_code
-                    })
+                        "parent_name": method["name"],
+                        "parent_type": "method",
+
+                        "code_summary" : None
+                    }
+                    output_data.append(method_summary)
+                    if summary_jobs is not None:
+                        summary_jobs.append((method_summary, item_source(method, file_path, code_store)))
+
+    # Add code (if code exists outside functions/classes)
+    if inline_code or inline_ref:
+        output_data.append({
+            "type": "code",
+            "name": file,
+            "parent_name": file,
+            "parent_type": "file",
+            **entity_code_fields(inline_item)
+        })
+
+    return list(assign_entity_ids(output_data))
+
+
+def manifest_path_for(output_file):
+    """
+    Manifest of parsed files kept next to the output file (code_parser.json -> code_parser.json.manifest.json).
+    The full file name is kept so .json and .jsonl outputs of the same base name have separate manifests.
+    """
+    return output_file + ".manifest.json"
+
+
+def hash_file(file_path):
+    """SHA-256 of the file content."""
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def fingerprint_file(file_path, previous=None):
+    """
+    Return {size, mtime, sha256} for the file. The content hash is reused from the
+    previous manifest entry when size and mtime have not changed.
+    """
+    stat = os.stat(file_path)
+    fingerprint = {"size": stat.st_size, "mtime": stat.st_mtime}
+    if previous and previous.get("size") == stat.st_size and previous.get("mtime") == stat.st_mtime:
+        fingerprint["sha256"] = previous.get("sha256")
+    else:
+        fingerprint["sha256"] = hash_file(file_path)
+    return fingerprint
+
+
+def load_manifest(manifest_file):
+    try:
+        with open(manifest_file, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def save_manifest(manifest_file, manifest):
+    try:
+        with open(manifest_file, 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, indent=4)
+    except Exception as e:
+        print(f"Error saving manifest file: {e}")
+
+
+def group_entities_by_file(entities):
+    """
+    Group entities from a previous run by the file they were extracted from.
+    Folders and relationship records (re-resolved on every run) are skipped; entities without a path
+    (inline "code") belong to the file emitted just before them.
+    """
+    grouped = {}
+    current_path = None
+    for entity in entities:
+        if entity.get("type") in ("folder", "relationship"):
+            continue
+        current_path = entity.get("path") or current_path
+        if current_path is not None:
+            grouped.setdefault(current_path, []).append(entity)
+    return grouped
+
+
+def is_node_entity(entity):
+    """True for entities written as graph nodes: everything with a path except relationship records."""
+    return entity.get("type") != "relationship" and entity.get("path") is not None
+
+
+def count_node_entities(file_location):
+    """
+    Number of graph nodes in a parser output file, as recorded in its manifest by the parser; counted from
+    the file for output written before the manifest had the count.
+    """
+    manifest = load_manifest(manifest_path_for(file_location))
+    if manifest and "nodes" in manifest:
+        return manifest["nodes"]
+    return sum(1 for entity in read_entities(file_location) if is_node_entity(entity))
+
+
+def read_entities(file_location):
+    """
+    Lazily yield entities from a parser output file: JSONL (one entity per line) or a JSON array.
+    """
+    with open(file_location, 'r', encoding='utf-8') as f:
+        if file_location.endswith(".jsonl"):
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+        else:
+            yield from json.load(f)
+
+
+def iter_hierarchy_entities(walk, root_path, include_levels, summary_flag, reuse=None, workers=1,
+                            summary_concurrency=1, summary_batch_tokens=0, window=None, compact=False,
+                            progress=None, content_hashes=None):
+    """
+    Yield entities in output order for a pre-computed walk [(root, files)].
+    Files are parsed and summarized `window` files at a time (all at once when window is None) so
+    streaming callers only hold one window in memory. reuse maps file_path -> entities carried over
+    from a previous run instead of re-parsing. compact emits code_ref offsets instead of code text.
+    progress(counter, done=1, total=0) is called with "files_parsed" and "entities_summarized" updates.
+    content_hashes maps file_path -> SHA-256, stored on the file entities.
+    """
+    reuse = reuse or {}
+    content_hashes = content_hashes or {}
+    units = []
+    for root, files in walk:
+        units.append((root, None))
+        units.extend((root, file) for file in files)
+    window = window or len(units) or 1
+
+    if workers is None or workers <= 0:
+        workers = os.cpu_count() or 1
+    executor = ProcessPoolExecutor(max_workers=workers) if workers > 1 else None
+    code_store = CodeStore() if compact else None
+    try:
+        for start in range(0, len(units), window):
+            batch = units[start:start + window]
+            to_parse = [
+                os.path.join(root, file) for root, file in batch
+                if file is not None and os.path.join(root, file) not in reuse
+            ]
+            parsed = dict(zip(to_parse, parse_files(to_parse, workers, executor=executor, compact=compact,
+                                                    progress=progress)))
+
+            summary_jobs = [] if summary_flag != 'False' else None
+            batch_entities = []
+            for root, file in batch:
+                if file is None:
+                    # Add folder details (Folders do not have code)
+                    if "folders" in include_levels:
+                        folder_name = os.path.basename(root)
+                        parent_folder = os.path.dirname(root) if root != root_path else None
+                        print(parent_folder)
+                        batch_entities.append([{
+                            "type": "folder",
+                            "name": folder_name,
+                            "path": root,
+                            "id": entity_id("folder", root),
+                            "parent_id": None,
+                            "parent_name": None,  # Folder has no parent name
+                            "parent_type": None,  # Folder has no parent type
+                            "code": None
+                        }])
+                    continue
+                file_path = os.path.join(root, file)
+                if file_path in reuse:
+                    batch_entities.append(reuse[file_path])
+                    continue
+                # Extract code entities if detailed analysis is included
+                code_entities = parsed[file_path]
+                batch_entities.append(
+                    build_file_entities(root, file, code_entities, include_levels, summary_jobs, code_store,
+                                        content_hash=content_hashes.get(file_path))
+                )
+
+            summarize_entities(summary_jobs, summary_flag, concurrency=summary_concurrency,
+                               batch_tokens=summary_batch_tokens, progress=progress)
+            for entities in batch_entities:
+                yield from entities
+    finally:
+        if executor is not None:
+            # Queued parse tasks are dropped when the run is cancelled
+            executor.shutdown(cancel_futures=True)
+        if code_store is not None:
+            code_store.close()
+
+
+def with_relationships(entities, root_path):
+    """
+    Pass entities through while indexing them, then append the resolved IMPORTS and CALLS relationship records.
+    """
+    index = CodeGraphIndex(root_path)
+    try:
+        for entity in entities:
+            index.add(entity)
+            yield entity
+        yield from index.relationships()
+    finally:
+        entities.close()
+
+
+def without_ids(entities):
+    """
+    Pass entities through without their id and parent_id; the loaders derive them again from type, path and
+    qualified name (code_graph.assign_entity_ids). Relationship records keep their endpoint ids.
+    """
+    try:
+        for entity in entities:
+            if entity.get("type") != "relationship":
+                entity = {key: value for key, value in entity.items() if key not in ("id", "parent_id")}
+            yield entity
+    finally:
+        entities.close()
+
+
+def extract_hierarchy_with_code(root_path, allowed_extensions, include_levels, output_file, summary_flag, workers=1,
+                                incremental=False, summary_concurrency=1, summary_batch_tokens=0, stream=False,
+                                compact=False, progress=None):
+    """
+    Traverse the directory and extract a flat structure with code and relationships.
+    With workers > 1 the per-file AST parsing runs in a process pool; output order is unchanged.
+    With incremental=True only files whose content changed since the last run (per the manifest
+    next to output_file) are re-parsed; entities of untouched files are carried over.
+    Summaries are generated after the AST pass, concurrently when summary_concurrency > 1 and with
+    small entities of a file packed into shared prompts when summary_batch_tokens > 0.
+    With stream=True entities are appended to output_file as JSONL while the walk progresses and
+    the number of entities written is returned instead of the list.
+    With compact=True entities record code_ref offsets (the entity path is the file id) instead of
+    duplicating code text, node ids are left for the loaders to derive and JSON output is not indented;
+    resolve the code with code_store.CodeStore when it is needed.
+    With "relationships" in include_levels, imports and call sites are resolved during the pass and
+    IMPORTS / CALLS relationship records are appended after the entities.
+    progress(counter, done=1, total=0) receives files_parsed / entities_summarized updates for background jobs;
+    an exception raised from it (e.g. on cancellation) aborts the run.
+    """
+    root_path = os.path.normpath(root_path)
+    print(include_levels)
+
+    manifest_file = manifest_path_for(output_file)
+    settings = {
+        "root_path": root_path,
+        "allowed_extensions": list(allowed_extensions),
+        "include_levels": list(include_levels),
+        "summary_flag": summary_flag,
+        "compact": compact,
+        # Bump when the entity fields change so output of older versions is not reused
+        "entity_format": 3,
+    }
+    previous_manifest = load_manifest(manifest_file) if incremental else None
+    previous_entities = {}
+    if previous_manifest and previous_manifest.get("settings") == settings:
+        try:
+            previous_entities = group_entities_by_file(read_entities(output_file))
+        except (OSError, ValueError) as e:
+            print(f"Previous output not usable, running a full parse: {e}")
+    if not previous_entities:
+        previous_manifest = None
+    previous_files = previous_manifest["files"] if previous_manifest else {}
+
+    # Walk once so files can be parsed up-front (in parallel if requested)
+    walk = []
+    for root, _, files in os.walk(root_path):
+        walk.append((root, [file for file in files if any(file.endswith(ext) for ext in allowed_extensions)]))
+    file_paths = [os.path.join(root, file) for root, files in walk for file in files]
+
+    manifest_files = {}
+    for file_path in file_paths:
+        manifest_files[file_path] = fingerprint_file(file_path, previous_files.get(file_path))
+    reuse = {
+        file_path: previous_entities[file_path] for file_path in file_paths
+        if file_path in previous_entities
+        and previous_files.get(file_path, {}).get("sha256") == manifest_files[file_path]["sha256"]
+    }
+
+    if progress:
+        progress("files_parsed", len(reuse), len(file_paths))
+
+    entities = iter_hierarchy_entities(walk, root_path, include_levels, summary_flag, reuse=reuse, workers=workers,
+                                       summary_concurrency=summary_concurrency,
+                                       summary_batch_tokens=summary_batch_tokens,
+                                       window=STREAM_WINDOW_FILES if stream else None, compact=compact,
+                                       progress=progress,
+                                       content_hashes={path: entry["sha256"] for path, entry in manifest_files.items()})
+    if "relationships" in include_levels:
+        entities = with_relationships(entities, root_path)
+    if compact:
+        entities = without_ids(entities)
+    output_data = []
+    entity_count = 0
+    node_count = 0
+    try:
+        if stream:
+            # Append as each window of files finishes so a crash keeps the work done so far
+            with open(output_file, 'w', encoding='utf-8') as jsonl_file:
+                for entity in entities:
+                    jsonl_file.write(json.dumps(entity) + "\n")
+                    entity_count += 1
+                    node_count += is_node_entity(entity)
+                    if entity.get("type") == "file":
+                        jsonl_file.flush()
+        else:
+            output_data = list(entities)
+            entity_count = len(output_data)
+            node_count = sum(1 for entity in output_data if is_node_entity(entity))
+    finally:
+        entities.close()
+
+    if incremental:
+        removed = len(set(previous_files) - set(manifest_files))
+        parsed_count = len(file_paths) - len(reuse)
+        print(f"Incremental parse: {parsed_count} parsed, {len(reuse)} reused, {removed} removed")
+    if summary_flag != 'False' and get_summary_cache() is not None:
+        print(f"Summary cache: {get_summary_cache().stats()}")
 
     # Save the data
     try:
-        with open(output_file, 'w', encoding='utf-8') as json_file:
-            json.dump(output_data, json_file, indent=4)
+        if not stream:
+            with open(output_file, 'w', encoding='utf-8') as json_file:
+                json.dump(output_data, json_file, indent=None if compact else 4)
         print(f"Data saved to {output_file}")
+        save_manifest(manifest_file, {"settings": settings, "files": manifest_files, "nodes": node_count})
     except Exception as e:
         print(f"Error saving JSON file: {e}")
 
-    return output_data
+    return entity_count if stream else output_data
 
-def generate_code_summary(source_code,summary_flag):
-    if summary_flag == 'False':
-        return 
+# Bump when the summary prompt changes so cached summaries are not reused across prompts
+SUMMARY_PROMPT_VERSION = "1"
+# Same for the prompt packing several entities into one request (build_batch_summary_messages); its summaries
+# are cached apart from single-prompt ones and only reused by runs with batching enabled
+BATCH_SUMMARY_PROMPT_VERSION = "batch-1"
+
+_openai_client = None
+
+
+def get_openai_client():
+    """Shared OpenAI client, created on first use from the OPEN_AI key."""
+    global _openai_client
+    if _openai_client is None:
+        _openai_client = OpenAI(
+            api_key= os.getenv('OPEN_AI')
+        )
+    return _openai_client
+
+
+def build_summary_messages(source_code):
     prompt = f"""
     You are a highly skilled software developer and code reviewer. 
     Your task is to provide a concise summary of the following code. 
@@ -317,28 +748,178 @@ def generate_code_summary(source_code,summary_flag):
 
     Summary:
     """
-    model_name = os.getenv('MODEL_NAME')
-    open_ai = os.getenv('OPEN_AI')
-    client = OpenAI(
-        api_key= open_ai  
+    # Define the input messages
+    return [
+        {"role": "system", "content": "You are an AI assistant that summarizes source code."},
+        {"role": "user", "content": prompt}
+    ]
+
+
+def build_batch_summary_messages(entries):
+    """
+    Prompt for summarizing several small code segments at once; entries is a list of (entity_id, source_code).
+    """
+    segments = "\n\n".join(
+        f"### id: {entity_id}\n```\n{source_code}\n```" for entity_id, source_code in entries
     )
+    prompt = f"""
+    You are a highly skilled software developer and code reviewer. 
+    Your task is to provide a concise summary of each of the following code segments. 
+    Focus on explaining what the code does, its purpose, 
+    and any key details about its functionality. 
+    Do not include comments or technical jargon that is unnecessary.
+    Return exactly one summary per id.
 
-    # Define the input messages
-    messages = [
+    Code segments:
+    {segments}
+    """
+    return [
         {"role": "system", "content": "You are an AI assistant that summarizes source code."},
         {"role": "user", "content": prompt}
     ]
 
+
+def pack_summary_batches(candidates, batch_tokens, max_entity_tokens):
+    """
+    Group (key, path, source_code) candidates into per-file batches under the batch_tokens budget.
+    Returns (batches, singles): entities larger than max_entity_tokens, and files with a single
+    small entity, stay on the single-entity path.
+    """
+    by_file = {}
+    singles = []
+    for key, path, source_code in candidates:
+        tokens = len(str(source_code)) // 4
+        if tokens > max_entity_tokens:
+            singles.append((key, source_code))
+        else:
+            by_file.setdefault(path, []).append((key, source_code, tokens))
+
+    batches = []
+    for entries in by_file.values():
+        batch, used = [], 0
+        for key, source_code, tokens in entries:
+            if batch and used + tokens > batch_tokens:
+                batches.append(batch)
+                batch, used = [], 0
+            batch.append((key, source_code))
+            used += tokens
+        if batch:
+            batches.append(batch)
+
+    packed = []
+    for batch in batches:
+        if len(batch) == 1:
+            singles.extend(batch)
+        else:
+            packed.append(batch)
+    return packed, singles
+
+
+def generate_code_summary(source_code,summary_flag):
+    if summary_flag == 'False':
+        return 
+    model_name = os.getenv('MODEL_NAME')
+
+    # Unchanged code segments are answered from the on-disk cache
+    cache = get_summary_cache()
+    cache_key = SummaryCache.make_key(source_code, model_name, SUMMARY_PROMPT_VERSION)
+    if cache is not None:
+        summary = cache.get(cache_key)
+        if summary is not None:
+            return summary
+
     # Call the ChatCompletion API
-    response = client.chat.completions.create(
+    response = get_openai_client().chat.completions.create(
         model= model_name, 
-        messages=messages,
+        messages=build_summary_messages(source_code),
         #temperature=0.5
     )
 
     # Extract the assistant's reply
     summary = response.choices[0].message.content
+    if cache is not None:
+        cache.put(cache_key, summary)
     
     return summary
 
 
+def make_async_openai_client():
+    return AsyncOpenAI(api_key=os.getenv('OPEN_AI'))
+
+
+def summarize_entities(summary_jobs, summary_flag, concurrency=1, batch_tokens=0, progress=None):
+    """
+    Summarization stage run after the AST pass: fills code_summary on every queued (entity, source_code) job.
+    With concurrency > 1 or batch_tokens > 0 cache misses go through the async engine in summarizer.py,
+    limited by SUMMARY_RPM / SUMMARY_TPM; identical code segments are summarized once.
+    With batch_tokens > 0 small entities of the same file (up to SUMMARY_BATCH_MAX_ENTITY_TOKENS each)
+    share one structured-output request; their summaries are cached under BATCH_SUMMARY_PROMPT_VERSION.
+    progress("entities_summarized") is called as each entity gets its summary.
+    """
+    if summary_flag == 'False' or not summary_jobs:
+        return
+    if progress:
+        progress("entities_summarized", 0, len(summary_jobs))
+    if concurrency <= 1 and not batch_tokens:
+        for entity, source_code in summary_jobs:
+            entity["code_summary"] = generate_code_summary(source_code, summary_flag)
+            if progress:
+                progress("entities_summarized")
+        return
+
+    model_name = os.getenv('MODEL_NAME')
+    cache = get_summary_cache()
+    pending = {}
+    candidates = []
+    for entity, source_code in summary_jobs:
+        cache_key = SummaryCache.make_key(source_code, model_name, SUMMARY_PROMPT_VERSION)
+        if cache_key in pending:
+            pending[cache_key].append(entity)
+            continue
+        summary = cache.get(cache_key) if cache is not None else None
+        if summary is None and batch_tokens and cache is not None:
+            summary = cache.get(SummaryCache.make_key(source_code, model_name, BATCH_SUMMARY_PROMPT_VERSION))
+        if summary is not None:
+            entity["code_summary"] = summary
+            if progress:
+                progress("entities_summarized")
+            continue
+        pending[cache_key] = [entity]
+        candidates.append((cache_key, entity.get("path"), source_code))
+
+    batches = []
+    batch_cache_keys = {}  # cache key of a batched segment -> its key under the batch prompt version
+    if batch_tokens:
+        max_entity_tokens = int(os.getenv('SUMMARY_BATCH_MAX_ENTITY_TOKENS', '400'))
+        packed, singles = pack_summary_batches(candidates, batch_tokens, max_entity_tokens)
+        for batch in packed:
+            entries = [(str(i), source_code) for i, (_, source_code) in enumerate(batch)]
+            members = {
+                str(i): (cache_key, build_summary_messages(source_code))
+                for i, (cache_key, source_code) in enumerate(batch)
+            }
+            batches.append((build_batch_summary_messages(entries), members))
+            for cache_key, source_code in batch:
+                batch_cache_keys[cache_key] = SummaryCache.make_key(source_code, model_name,
+                                                                    BATCH_SUMMARY_PROMPT_VERSION)
+    else:
+        singles = [(cache_key, source_code) for cache_key, _, source_code in candidates]
+    items = [(cache_key, build_summary_messages(source_code)) for cache_key, source_code in singles]
+
+    def on_complete(cache_key, summary):
+        for entity in pending[cache_key]:
+            entity["code_summary"] = summary
+        if cache is not None:
+            cache.put(batch_cache_keys.get(cache_key, cache_key), summary)
+        if progress:
+            progress("entities_summarized", len(pending[cache_key]))
+
+    if items or batches:
+        rpm = os.getenv('SUMMARY_RPM')
+        tpm = os.getenv('SUMMARY_TPM')
+        stats = run_summary_requests(make_async_openai_client(), model_name, items, on_complete,
+                                     concurrency=max(1, concurrency),
+                                     requests_per_minute=float(rpm) if rpm else None,
+                                     tokens_per_minute=float(tpm) if tpm else None,
+                                     batches=batches)
+        print(f"Summary requests: {stats}")
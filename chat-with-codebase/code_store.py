@@ -0,0 +1,146 @@
+import hashlib
+import mmap
+import re
+from collections import OrderedDict
+
+
+def line_byte_offsets(source_bytes):
+    """Byte offset at which each line starts."""
+    return [0] + [match.end() for match in re.finditer(b"\n", source_bytes)]
+
+
+def line_span(line_starts, source_bytes, line_number):
+    """[line, line, start_byte, end_byte] for a 1-based line number, excluding the line break."""
+    start_byte = line_starts[line_number - 1]
+    end_byte = line_starts[line_number] if line_number < len(line_starts) else len(source_bytes)
+    if source_bytes[end_byte - 1:end_byte] == b"\n":
+        end_byte -= 1
+    if end_byte > start_byte and source_bytes[end_byte - 1:end_byte] == b"\r":
+        end_byte -= 1
+    return [line_number, line_number, start_byte, end_byte]
+
+
+def make_code_ref(line_starts, source_bytes, start_line, end_line):
+    """
+    Compact reference to lines start_line..end_line (1-based, inclusive) of a file.
+    A code_ref is a list of spans [start_line, end_line, start_byte, end_byte]; the file is the entity's path.
+    """
+    first = line_span(line_starts, source_bytes, start_line)
+    last = line_span(line_starts, source_bytes, end_line)
+    return [[start_line, end_line, first[2], last[3]]]
+
+
+def make_lines_ref(line_starts, source_bytes, line_numbers, strip=False):
+    """
+    code_ref for an arbitrary set of lines; consecutive lines are merged into one span.
+    strip=True trims surrounding whitespace the way str.strip() does on the joined text.
+    """
+    lines = [line_span(line_starts, source_bytes, n) for n in line_numbers]
+    if strip:
+        while lines and not source_bytes[lines[0][2]:lines[0][3]].strip():
+            lines.pop(0)
+        while lines and not source_bytes[lines[-1][2]:lines[-1][3]].strip():
+            lines.pop()
+        if lines:
+            segment = source_bytes[lines[0][2]:lines[0][3]]
+            lines[0][2] += len(segment) - len(segment.lstrip())
+            segment = source_bytes[lines[-1][2]:lines[-1][3]]
+            lines[-1][3] -= len(segment) - len(segment.rstrip())
+    spans = []
+    for line in lines:
+        if spans and spans[-1][1] + 1 == line[0]:
+            spans[-1][1] = line[1]
+            spans[-1][3] = line[3]
+        else:
+            spans.append(line)
+    return spans
+
+
+class CodeStore:
+    """
+    Resolves code references (entity path + code_ref byte spans) against the source files.
+    Each file is memory-mapped once; at most max_open files stay mapped (least recently used are closed).
+    Files whose file entity carries a content_hash are checked against it before their references are read.
+    """
+    def __init__(self, max_open=64):
+        self.max_open = max_open
+        self.files = OrderedDict()
+        self.content_hashes = {}  # path -> content_hash recorded by the parser
+        self.verified = set()
+
+    def _map(self, path):
+        if path in self.files:
+            self.files.move_to_end(path)
+            return self.files[path][1]
+        f = open(path, 'rb')
+        try:
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            # Empty files cannot be mapped
+            mapped = b""
+        self.files[path] = (f, mapped)
+        if len(self.files) > self.max_open:
+            _, (old_file, old_map) = self.files.popitem(last=False)
+            if isinstance(old_map, mmap.mmap):
+                old_map.close()
+            old_file.close()
+        return mapped
+
+    def verify(self, path):
+        """Raise ValueError if the file at path no longer has the content_hash it was parsed with."""
+        expected = self.content_hashes.get(path)
+        if expected is None or path in self.verified:
+            return
+        try:
+            actual = hashlib.sha256(self._map(path)).hexdigest()
+        except OSError as e:
+            raise ValueError(f"{path} was parsed but cannot be read ({e}); re-run the parser") from e
+        if actual != expected:
+            raise ValueError(f"{path} changed since it was parsed; re-run the parser")
+        self.verified.add(path)
+
+    def read(self, path, code_ref):
+        """Return the code text for code_ref in the file at path."""
+        mapped = self._map(path)
+        return "\n".join(
+            mapped[start_byte:end_byte].decode('utf-8').replace("\r\n", "\n")
+            for _, _, start_byte, end_byte in code_ref
+        )
+
+    def resolve(self, entity, path=None):
+        """Return the entity with "code" filled in from its code_ref (unchanged if it has none)."""
+        code_ref = entity.get("code_ref")
+        if code_ref is None:
+            return entity
+        path = entity.get("path") or path
+        self.verify(path)
+        resolved = {key: value for key, value in entity.items() if key != "code_ref"}
+        try:
+            resolved["code"] = self.read(path, code_ref)
+        except (OSError, TypeError) as e:
+            print(f"Error reading code for {entity.get('name')} in {path}: {e}")
+            resolved["code"] = None
+        return resolved
+
+    def resolve_entities(self, entities):
+        """
+        Lazily resolve code references for an iterable of entities.
+        Entities without a path (inline "code") belong to the file emitted just before them.
+        Raises ValueError when a file was modified after parsing, as its byte offsets no longer apply.
+        """
+        current_path = None
+        for entity in entities:
+            if entity.get("type") != "folder":
+                current_path = entity.get("path") or current_path
+            if entity.get("type") == "file" and entity.get("content_hash"):
+                self.content_hashes[entity["path"]] = entity["content_hash"]
+                self.verified.discard(entity["path"])
+            yield self.resolve(entity, current_path)
+
+    def close(self):
+        for f, mapped in self.files.values():
+            if isinstance(mapped, mmap.mmap):
+                mapped.close()
+            f.close()
+        self.files.clear()
+        self.verified.clear()
@@ -0,0 +1,360 @@
+import os
+import time
+import sqlite3
+import threading
+
+from code_graph import assign_entity_ids
+from neo4j_lib import Neo4jLoader, NODE_PROPERTIES, get_driver, tracked_session, new_graph_version, read_graph_version
+
+# Parameterized versions of the question patterns used in the Cypher prompt examples. Lookups by name start
+# from labeled nodes so they are seeks on the {label}_name indexes (see Neo4jLoader.ensure_schema)
+CYPHER_TEMPLATES = {
+    "functions_per_file": """
+        MATCH (f:file)-[:CONTAINS]->(m:function)
+        WHERE f.name ENDS WITH $suffix
+        RETURN f.name AS PythonFile, COUNT(m) AS FunctionCount
+        ORDER BY PythonFile
+    """,
+    "file_code": """
+        MATCH (f:file {name: $file_name})-[:CONTAINS]->(c:file_code)
+        RETURN f.name AS FileName, f.path AS FilePath, c.code AS Code
+    """,
+    "class_methods": """
+        MATCH (c:class {name: $class_name})-[:CONTAINS]->(m:method)-[:CONTAINS]->(mc:method_code)
+        RETURN c.name AS ClassName, m.name AS MethodName, mc.code_summary AS MethodSummary
+        ORDER BY MethodName
+    """,
+    "callers": """
+        CALL {
+            MATCH (f:function {name: $function_name}) RETURN f
+            UNION
+            MATCH (f:method {name: $function_name}) RETURN f
+            UNION
+            MATCH (f:class {name: $function_name}) RETURN f
+        }
+        MATCH (caller)-[:CALLS]->(f)
+        RETURN f.name AS Callee, labels(caller)[0] AS CallerType, caller.name AS Caller, caller.path AS CallerPath
+        ORDER BY CallerPath, Caller
+    """,
+    "file_imports": """
+        MATCH (f:file)-[:IMPORTS]->(t:file {name: $file_name})
+        RETURN t.name AS ImportedFile, f.name AS ImportingFile, f.path AS ImportingPath
+        ORDER BY ImportingPath
+    """,
+}
+
+SQL_TEMPLATES = {
+    "functions_per_file": """
+        SELECT f.name AS PythonFile, COUNT(m.id) AS FunctionCount
+        FROM nodes f
+        JOIN edges e ON e.source_id = f.id AND e.type = 'CONTAINS'
+        JOIN nodes m ON m.id = e.target_id AND m.label = 'function'
+        WHERE f.label = 'file' AND f.name LIKE '%' || :suffix
+        GROUP BY f.id
+        ORDER BY PythonFile
+    """,
+    "file_code": """
+        SELECT f.name AS FileName, f.path AS FilePath, c.code AS Code
+        FROM nodes f
+        JOIN edges e ON e.source_id = f.id AND e.type = 'CONTAINS'
+        JOIN nodes c ON c.id = e.target_id AND c.label = 'file_code'
+        WHERE f.label = 'file' AND f.name = :file_name
+    """,
+    "class_methods": """
+        SELECT c.name AS ClassName, m.name AS MethodName, mc.code_summary AS MethodSummary
+        FROM nodes c
+        JOIN edges e1 ON e1.source_id = c.id AND e1.type = 'CONTAINS'
+        JOIN nodes m ON m.id = e1.target_id AND m.label = 'method'
+        JOIN edges e2 ON e2.source_id = m.id AND e2.type = 'CONTAINS'
+        JOIN nodes mc ON mc.id = e2.target_id AND mc.label = 'method_code'
+        WHERE c.label = 'class' AND c.name = :class_name
+        ORDER BY MethodName
+    """,
+    "callers": """
+        SELECT f.name AS Callee, caller.label AS CallerType, caller.name AS Caller, caller.path AS CallerPath
+        FROM nodes f
+        JOIN edges e ON e.target_id = f.id AND e.type = 'CALLS'
+        JOIN nodes caller ON caller.id = e.source_id
+        WHERE f.name = :function_name AND f.label IN ('function', 'method', 'class')
+        ORDER BY CallerPath, Caller
+    """,
+    "file_imports": """
+        SELECT t.name AS ImportedFile, f.name AS ImportingFile, f.path AS ImportingPath
+        FROM nodes t
+        JOIN edges e ON e.target_id = t.id AND e.type = 'IMPORTS'
+        JOIN nodes f ON f.id = e.source_id AND f.label = 'file'
+        WHERE t.label = 'file' AND t.name = :file_name
+        ORDER BY ImportingPath
+    """,
+}
+
+# Defaults for optional template parameters
+TEMPLATE_DEFAULTS = {"functions_per_file": {"suffix": ".py"}}
+
+
+class GraphBackend:
+    """
+    Storage for the code graph: loads parser entities (nodes + CONTAINS / CALLS / IMPORTS edges),
+    describes its schema for the prompts and answers the named query templates.
+    """
+    supports_cypher = False
+
+    def load(self, entities, progress=None, **options):
+        """Write the entities (an iterable of parser output records); options are backend specific."""
+        raise NotImplementedError
+
+    def schema(self):
+        raise NotImplementedError
+
+    def run_template(self, name, **params):
+        """Run a named query template (see CYPHER_TEMPLATES) and return the rows as dicts."""
+        raise NotImplementedError
+
+    def version(self):
+        """Version token stored with the graph and replaced by every write (None before the first one)."""
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+def template_params(name, params):
+    if name not in CYPHER_TEMPLATES:
+        raise ValueError(f"Unknown query template: {name}")
+    return {**TEMPLATE_DEFAULTS.get(name, {}), **params}
+
+
+class Neo4jBackend(GraphBackend):
+    """The code graph in Neo4j, through the shared driver."""
+    supports_cypher = True
+
+    def __init__(self, driver=None):
+        self.driver = driver
+
+    def load(self, entities, progress=None, **options):
+        loader = Neo4jLoader(driver=self.driver or get_driver())
+        return loader.load_data(entities, progress=progress, **options)
+
+    def schema(self):
+        # Imported here so the embedded backend does not need langchain
+        from lg_neo4j import get_graph
+        graph = get_graph()
+        graph.refresh_schema()
+        return graph.schema
+
+    def run_template(self, name, **params):
+        params = template_params(name, params)
+        with tracked_session(self.driver or get_driver()) as session:
+            return [record.data() for record in session.run(CYPHER_TEMPLATES[name], **params)]
+
+    def version(self):
+        return read_graph_version(self.driver or get_driver())
+
+
+class SQLiteGraphBackend(GraphBackend):
+    """
+    Embedded code graph in SQLite: a nodes table keyed by entity id and an edges table with indexes on both
+    directions, so template queries are joins over indexed adjacency instead of a running server.
+    """
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(db_path, check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS nodes (id TEXT PRIMARY KEY, label TEXT, "
+            + ", ".join(f"{name} TEXT" for name in NODE_PROPERTIES) + ")"
+        )
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS edges (source_id TEXT, type TEXT, target_id TEXT, "
+            "PRIMARY KEY (source_id, type, target_id))"
+        )
+        self.conn.execute("CREATE INDEX IF NOT EXISTS nodes_label_name ON nodes(label, name)")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS nodes_name ON nodes(name)")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS nodes_path ON nodes(path)")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS edges_target ON edges(target_id, type)")
+        self.conn.execute("CREATE TABLE IF NOT EXISTS graph_meta (key TEXT PRIMARY KEY, value TEXT)")
+        self.conn.commit()
+
+    def load(self, entities, progress=None, batch_size=1000, **options):
+        """
+        Upsert nodes and edges batch_size rows at a time; returns the same message as the Neo4j loader.
+        The graph version is replaced afterwards, also when the load fails part way.
+        """
+        node_sql = (
+            "INSERT OR REPLACE INTO nodes (id, label, " + ", ".join(NODE_PROPERTIES) + ") VALUES ("
+            + ", ".join("?" * (len(NODE_PROPERTIES) + 2)) + ")"
+        )
+        edge_sql = "INSERT OR IGNORE INTO edges (source_id, type, target_id) VALUES (?, ?, ?)"
+        nodes = []
+        edges = []
+
+        def flush():
+            with self.lock:
+                self.conn.executemany(node_sql, nodes)
+                self.conn.executemany(edge_sql, edges)
+                self.conn.commit()
+            if progress and nodes:
+                progress("nodes_written", len(nodes))
+            nodes.clear()
+            edges.clear()
+
+        try:
+            for item in assign_entity_ids(entities):
+                if item.get("type") == "relationship":
+                    if item.get("source_id") and item.get("target_id"):
+                        edges.append((item["source_id"], item["relationship"], item["target_id"]))
+                elif item.get("path") is not None:
+                    nodes.append((item["id"], item["type"]) + tuple(item.get(key) for key in NODE_PROPERTIES))
+                    if item.get("parent_id"):
+                        edges.append((item["parent_id"], "CONTAINS", item["id"]))
+                if len(nodes) + len(edges) >= batch_size:
+                    flush()
+            flush()
+        finally:
+            with self.lock:
+                self.conn.execute("INSERT OR REPLACE INTO graph_meta (key, value) VALUES ('version', ?)",
+                                  (new_graph_version(),))
+                self.conn.commit()
+        return "Nodes and Edges created successfully"
+
+    def schema(self):
+        """Schema description in the same layout as Neo4jGraph.schema."""
+        counts = ", ".join(f"COUNT({name})" for name in NODE_PROPERTIES)
+        with self.lock:
+            label_rows = self.conn.execute(f"SELECT label, {counts} FROM nodes GROUP BY label ORDER BY label").fetchall()
+            edge_rows = self.conn.execute(
+                "SELECT DISTINCT s.label, e.type, t.label FROM edges e "
+                "JOIN nodes s ON s.id = e.source_id JOIN nodes t ON t.id = e.target_id ORDER BY 1, 2, 3"
+            ).fetchall()
+        lines = ["Node properties:"]
+        for row in label_rows:
+            properties = ["id: STRING"] + [
+                f"{name}: STRING" for name, count in zip(NODE_PROPERTIES, tuple(row)[1:]) if count
+            ]
+            lines.append(f"{row[0]} {{{', '.join(properties)}}}")
+        lines += ["Relationship properties:", "", "The relationships:"]
+        lines += [f"(:{source})-[:{edge_type}]->(:{target})" for source, edge_type, target in edge_rows]
+        return "\n".join(lines)
+
+    def run_template(self, name, **params):
+        params = template_params(name, params)
+        with self.lock:
+            return [dict(row) for row in self.conn.execute(SQL_TEMPLATES[name], params).fetchall()]
+
+    def version(self):
+        with self.lock:
+            row = self.conn.execute("SELECT value FROM graph_meta WHERE key = 'version'").fetchone()
+        return row[0] if row else None
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def get_backend():
+    """
+    Process-wide graph backend chosen by GRAPH_BACKEND: "neo4j" (default) or "sqlite",
+    stored at GRAPH_SQLITE_PATH (default code_graph.db).
+    """
+    global _backend
+    with _backend_lock:
+        if _backend is None:
+            kind = os.getenv('GRAPH_BACKEND', 'neo4j').lower()
+            if kind == "sqlite":
+                _backend = SQLiteGraphBackend(os.getenv('GRAPH_SQLITE_PATH', 'code_graph.db'))
+            elif kind == "neo4j":
+                _backend = Neo4jBackend()
+            else:
+                raise ValueError(f"Unknown GRAPH_BACKEND: {kind}")
+        return _backend
+
+
+def close_backend():
+    global _backend
+    with _backend_lock:
+        if _backend is not None:
+            _backend.close()
+            _backend = None
+
+
+class SchemaCache:
+    """
+    Process-wide cache of the schema string used in the prompts. Entries expire after ttl seconds and are
+    dropped explicitly by invalidate() after an ingest. Only one caller refreshes at a time; others wait for it.
+    """
+    def __init__(self, ttl=600):
+        self.ttl = ttl
+        self.value = None
+        self.loaded_at = None
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self.lock = threading.Lock()
+
+    def get(self, load):
+        with self.lock:
+            if self.value is not None and time.time() - self.loaded_at < self.ttl:
+                self.hits += 1
+                return self.value
+            self.misses += 1
+            self.value = load()
+            self.loaded_at = time.time()
+            return self.value
+
+    def invalidate(self):
+        with self.lock:
+            self.value = None
+            self.loaded_at = None
+            self.invalidations += 1
+
+    def stats(self):
+        with self.lock:
+            total = self.hits + self.misses
+            return {
+                "ttl_seconds": self.ttl,
+                "cached": self.value is not None,
+                "age_seconds": round(time.time() - self.loaded_at, 1) if self.loaded_at else None,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / total, 4) if total else 0.0,
+                "invalidations": self.invalidations,
+            }
+
+
+schema_cache = SchemaCache(ttl=float(os.getenv('SCHEMA_CACHE_TTL', '600')))
+
+
+def get_schema():
+    """Schema of the configured backend, served from schema_cache."""
+    return schema_cache.get(lambda: get_backend().schema())
+
+
+_seen_version = None
+
+
+def graph_version():
+    """
+    Version token of the graph, read from the backend on every call; every writer (API ingest and sync,
+    Neo4jLoader used directly, neo4j-admin import files) stores a new one, so cached query results keyed
+    by it are not served after a write made by any worker or tool. A version different from the one seen
+    last also drops the cached schema.
+    """
+    global _seen_version
+    version = get_backend().version()
+    with _backend_lock:
+        changed = version != _seen_version
+        _seen_version = version
+    if changed:
+        schema_cache.invalidate()
+    return version
+
+
+def graph_changed():
+    """Drop the cached schema right after this process wrote the graph (the writer replaced the version)."""
+    schema_cache.invalidate()
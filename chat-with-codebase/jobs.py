@@ -0,0 +1,143 @@
+import os
+import time
+import uuid
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+
+class JobCancelled(Exception):
+    """Raised from a job's progress callback once cancellation was requested."""
+
+
+class Job:
+    """
+    State of one background parse/ingest job. Work functions receive job.progress as their
+    progress callback: progress(counter, done=1, total=0) adds to the counter's done/total
+    and raises JobCancelled when the job was cancelled, which stops the work at the next checkpoint.
+    """
+    def __init__(self, kind, params=None):
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        self.params = params or {}
+        self.status = "queued"
+        self.counters = {}
+        self.result = None
+        self.error = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.cancel_event = threading.Event()
+        self.lock = threading.Lock()
+
+    def progress(self, counter, done=1, total=0):
+        with self.lock:
+            entry = self.counters.setdefault(counter, {"done": 0, "total": 0})
+            entry["done"] += done
+            entry["total"] += total
+        if self.cancel_event.is_set():
+            raise JobCancelled(f"Job {self.id} cancelled")
+
+    def cancel(self):
+        self.cancel_event.set()
+        if self.status == "queued":
+            self.status = "cancelled"
+            self.finished_at = time.time()
+
+    def fraction_done(self):
+        with self.lock:
+            done = sum(min(c["done"], c["total"]) for c in self.counters.values() if c["total"])
+            total = sum(c["total"] for c in self.counters.values())
+        if self.status == "completed":
+            return 1.0
+        return done / total if total else 0.0
+
+    def eta_seconds(self):
+        """Remaining time extrapolated from the elapsed time and the fraction of known work done."""
+        if self.status != "running" or not self.started_at:
+            return None
+        fraction = self.fraction_done()
+        if fraction <= 0:
+            return None
+        elapsed = time.time() - self.started_at
+        return elapsed * (1 - fraction) / fraction
+
+    def to_dict(self):
+        with self.lock:
+            counters = {name: dict(values) for name, values in self.counters.items()}
+        return {
+            "job_id": self.id,
+            "kind": self.kind,
+            "status": self.status,
+            "params": self.params,
+            "files_parsed": counters.get("files_parsed", {}).get("done", 0),
+            "files_total": counters.get("files_parsed", {}).get("total", 0),
+            "entities_summarized": counters.get("entities_summarized", {}).get("done", 0),
+            "entities_to_summarize": counters.get("entities_summarized", {}).get("total", 0),
+            "nodes_written": counters.get("nodes_written", {}).get("done", 0),
+            "nodes_total": counters.get("nodes_written", {}).get("total", 0),
+            "progress": round(self.fraction_done(), 4),
+            "eta_seconds": self.eta_seconds(),
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "result": self.result,
+            "error": self.error,
+        }
+
+
+class JobManager:
+    """Runs parse/ingest work in a background thread pool and keeps the jobs for status queries."""
+    def __init__(self, max_workers=2, max_jobs=200):
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="job")
+        self.jobs = {}
+        self.max_jobs = max_jobs
+        self.lock = threading.Lock()
+
+    def submit(self, kind, fn, *args, params=None, **kwargs):
+        """Schedule fn(*args, progress=job.progress, **kwargs) and return the Job."""
+        job = Job(kind, params)
+        with self.lock:
+            self.jobs[job.id] = job
+            self._prune()
+        self.executor.submit(self._run, job, fn, args, kwargs)
+        return job
+
+    def _run(self, job, fn, args, kwargs):
+        if job.cancel_event.is_set():
+            return
+        job.status = "running"
+        job.started_at = time.time()
+        try:
+            job.result = fn(*args, progress=job.progress, **kwargs)
+            job.status = "completed"
+        except JobCancelled:
+            job.status = "cancelled"
+        except Exception as e:
+            print(f"Job {job.id} failed: {e}")
+            job.error = str(e)
+            job.status = "failed"
+        finally:
+            job.finished_at = time.time()
+
+    def _prune(self):
+        finished = [job for job in self.jobs.values() if job.finished_at is not None]
+        finished.sort(key=lambda job: job.finished_at)
+        while len(self.jobs) > self.max_jobs and finished:
+            del self.jobs[finished.pop(0).id]
+
+    def get(self, job_id):
+        return self.jobs.get(job_id)
+
+    def cancel(self, job_id):
+        job = self.jobs.get(job_id)
+        if job is not None:
+            job.cancel()
+        return job
+
+    def shutdown(self):
+        for job in list(self.jobs.values()):
+            job.cancel()
+        self.executor.shutdown(wait=False)
+
+
+job_manager = JobManager(max_workers=int(os.getenv('JOB_WORKERS', '2')))
@@ -7,9 +7,20 @@ from langgraph.graph import StateGraph, START, END
 from langgraph.graph.message import add_messages
 from langgraph.checkpoint.memory import MemorySaver
 
-from langchain_neo4j import GraphCypherQAChain, Neo4jGraph
+from langchain_neo4j import GraphCypherQAChain
+from neo4j_graphrag.schema import get_structured_schema, format_schema
+from langchain_neo4j.chains.graph_qa.cypher import extract_cypher, get_function_response
 
 from langchain_core.prompts.prompt import PromptTemplate
+from langchain_core.callbacks import adispatch_custom_event
+from neo4j_lib import get_driver, tracked_session, GRAPH_META_LABEL
+from graph_backend import get_backend, get_schema, graph_version
+from query_cache import normalize_question, cypher_cache, result_cache
+from question_router import route_question, format_rows, router_stats
+from schema_pruner import prune_schema
+import hashlib
+import threading
+import asyncio
 import os
 
 SimplifierPrompt = """
@@ -110,6 +121,14 @@ MATCH (c:class)-[:contains]->(m:method)-[:contains]-(mc:method_code)
 WHERE c.name =  'async'
 RETURN m.name AS MethodName, mc.code_summary AS MethodSummary
 
+# Who calls the function 'generate_code_summary'?
+MATCH (caller)-[:CALLS]->(f:function {{name: 'generate_code_summary'}})
+RETURN f.name AS FunctionName, labels(caller)[0] AS CallerType, caller.name AS Caller, caller.path AS CallerPath
+
+# Which files import 'neo4j_lib.py'?
+MATCH (f:file)-[:IMPORTS]->(t:file {{name: 'neo4j_lib.py'}})
+RETURN t.name AS ImportedFile, f.name AS ImportingFile, f.path AS ImportingPath
+
 The question is:
 {question}
 
@@ -131,38 +150,160 @@ class AgentState(TypedDict):
     sub_query: Annotated[list, add_messages]
     neo4j_schema: Annotated[list, add_messages]
     final_results: Annotated[list, add_messages]
+    fast_path: str
+    failed: bool
+
+_graph = None
+_graph_lock = threading.Lock()
+
+class SharedDriverGraph:
+    """
+    Graph store (the langchain_neo4j GraphStore protocol) for the Cypher QA chain on the app-wide pooled
+    driver. Each call looks the driver up in the neo4j_lib registry, and queries run in tracked sessions
+    so question traffic is counted in /metrics. The schema is built with the neo4j_graphrag helpers
+    Neo4jGraph uses (apoc.meta.data); they run on the shared driver through driver.execute_query.
+    """
+    def __init__(self):
+        self.schema = ""
+        self.structured_schema = {}
+
+    @property
+    def get_schema(self):
+        return self.schema
+
+    @property
+    def get_structured_schema(self):
+        return self.structured_schema
+
+    def query(self, query, params=None):
+        with tracked_session(get_driver()) as session:
+            return [record.data() for record in session.run(query, params or {})]
+
+    def refresh_schema(self):
+        self.structured_schema = get_structured_schema(get_driver())
+        # The version node is bookkeeping, not part of the code graph the prompts describe
+        self.structured_schema["node_props"].pop(GRAPH_META_LABEL, None)
+        self.schema = format_schema(self.structured_schema, is_enhanced=False)
+
+    def add_graph_documents(self, graph_documents, include_source=False):
+        raise NotImplementedError("The code graph is written by neo4j_lib.Neo4jLoader")
+
+def get_graph():
+    """Shared graph store for the query path (see SharedDriverGraph)."""
+    global _graph
+    with _graph_lock:
+        if _graph is None:
+            _graph = SharedDriverGraph()
+        return _graph
+
+async def emit(name, data):
+    """Custom event for /ask_code/stream (astream_events); a no-op outside a workflow run."""
+    try:
+        await adispatch_custom_event(name, data)
+    except RuntimeError:
+        pass
+
+async def router(state):
+    """
+    Answers questions matching a fast-path pattern with the backend's query template (no LLM calls);
+    fast_path names the template when it did, and is empty when the question takes the LLM path.
+    """
+    question = state['user_query'][-1].content
+    route = route_question(question)
+    if route is None:
+        router_stats.record()
+        return {"fast_path": ""}
+    name, params = route
+    try:
+        key = (name, tuple(sorted(params.items())), graph_version())
+        rows = result_cache.get(key)
+        if rows is None:
+            rows = await asyncio.to_thread(get_backend().run_template, name, **params)
+            result_cache.put(key, rows)
+    except Exception as e:
+        print(f"\n*** Fast path {name} failed, using the LLM path ***\n", e)
+        rows = []
+    router_stats.record(name, len(rows))
+    await emit("rows", {"template": name, "params": params, "count": len(rows)})
+    if not rows:
+        return {"fast_path": ""}
+    print(f"\n*** Answered with query template {name} {params} ***\n")
+    return {"fast_path": name, "sub_query": [question], "final_results": [format_rows(rows)]}
+
+def isFastPath(state):
+    return 'answered' if state.get('fast_path') else 'llm'
 
 def neo4j_graph(state):
 
-    
-    NEO4J_URI = os.getenv('NEO4J_URI') 
-    NEO4J_USER = os.getenv('NEO4J_USER') 
-    NEO4J_PASSWORD = os.getenv('NEO4J_PASSWORD') 
-    
-
-    neo4j_instance = Neo4jGraph(url=NEO4J_URI, 
-                    username=NEO4J_USER, 
-                    password=NEO4J_PASSWORD,)
-    
-    neo4j_instance.refresh_schema()
-    schema = neo4j_instance.schema
+    # Schema of the configured graph backend (Neo4j, or the embedded SQLite graph), cached until the next ingest
+    schema = get_schema()
     print("\n*** Fetched Neo4j Schema ***\n")
     return {"neo4j_schema": [schema]}
 
-def simplifier(state):
+# Tag on the answering LLM runs of the Cypher QA chain (see /ask_code/stream)
+QA_TAG = "qa_answer"
+
+class QueryComponents:
+    """
+    LLM clients, prompts and the Cypher QA chain for one model configuration, built once and shared
+    by concurrent requests. The chain embeds the graph schema, so one is kept per schema string.
+    """
+    def __init__(self, model_name, cypher_model):
+        self.key = (model_name, cypher_model)
+        self.simplifier_llm = ChatOpenAI(model=model_name, temperature=0, max_retries=1).with_structured_output(SubQuery)
+        self.cypher_llm = ChatOpenAI(temperature=0, model=cypher_model)
+        self.qa_llm = ChatOpenAI(temperature=0, model=cypher_model)
+        self.cypher_prompt = PromptTemplate(input_variables=["schema", "question"], template=CypherQueryTemplate)
+        self.chain = None
+        self.chain_schema = None
+        self.lock = threading.Lock()
+
+    def chain_for(self, schema):
+        with self.lock:
+            if self.chain is None or self.chain_schema != schema:
+                chain = GraphCypherQAChain.from_llm(
+                    llm=self.cypher_llm,
+                    graph=get_graph(),
+                    verbose=True,
+                    qa_llm=self.qa_llm,
+                    cypher_prompt=self.cypher_prompt,
+                    validate_cypher=True,
+                    use_function_response=True,
+                    function_response_system="Respond as a developer! Use provided data but must not make up the response.",
+                    allow_dangerous_requests=True
+                )
+                # Use the (cached) schema the question was simplified against
+                chain.graph_schema = schema
+                # Tagged so streaming forwards the answer tokens and not the Cypher generation tokens
+                chain.qa_chain = chain.qa_chain.with_config(tags=[QA_TAG])
+                self.chain, self.chain_schema = chain, schema
+            return self.chain
+
+
+_components = None
+_components_lock = threading.Lock()
+
+def get_components():
+    """Shared QueryComponents, rebuilt when MODEL_NAME or CYPHER_MODEL_NAME (default gpt-4o-mini) changes."""
+    global _components
+    key = (os.getenv('MODEL_NAME'), os.getenv('CYPHER_MODEL_NAME', 'gpt-4o-mini'))
+    with _components_lock:
+        if _components is None or _components.key != key:
+            _components = QueryComponents(*key)
+        return _components
+
+async def simplifier(state):
 
-    model_name = os.getenv('MODEL_NAME') 
-    llm = ChatOpenAI(model=model_name, temperature=0, max_retries=1)
-    llm_with_tool = llm.bind_tools([SubQuery])
-    llm_with_so = llm.with_structured_output(SubQuery)
+    llm_with_so = get_components().simplifier_llm
     user_query = state['user_query'][-1] 
-    schema = state["neo4j_schema"][-1]
+    # Only the part of the schema relevant to the question goes into the prompt
+    schema = prune_schema(state["neo4j_schema"][-1].content, user_query.content)
     messages = [
         SystemMessage(content=SimplifierPrompt.format(schema=schema)), 
         HumanMessage(content=f"User Query: \n{user_query}")
     ]
     
-    response = llm_with_so.invoke(messages)
+    response = await llm_with_so.ainvoke(messages)
     
     return {"sub_query": response.sub_queries}
 
@@ -177,68 +318,119 @@ def isValidQuestion(state):
         return 'correct'
 
 
-def translate_to_cypher(state):
-    
-    NEO4J_URI = os.getenv('NEO4J_URI') 
-    NEO4J_USER = os.getenv('NEO4J_USER')
-    NEO4J_PASSWORD = os.getenv('NEO4J_PASSWORD') 
-    model_name = os.getenv('MODEL_NAME') 
+async def generate_cypher(chain, question, schema=None):
+    """
+    Cypher for a question from the chain's generation step, prompted with schema (default: the chain's
+    full schema) and cached per normalized question and schema.
+    """
+    schema = schema or chain.graph_schema
+    key = (normalize_question(question), hashlib.sha256(schema.encode("utf-8")).hexdigest())
+    cypher = cypher_cache.get(key)
+    if cypher is not None:
+        print(f"\n*** Cached Cypher ***\n{cypher}")
+        await emit("cypher", {"question": question, "cypher": cypher, "cached": True})
+        return cypher
+    cypher = await chain.cypher_generation_chain.ainvoke(
+        {"question": question, "schema": schema, "examples": None}
+    )
+    # Extract Cypher code if it is wrapped in backticks, then fix relationship directions
+    cypher = extract_cypher(cypher)
+    if chain.cypher_query_corrector:
+        cypher = chain.cypher_query_corrector(cypher)
+    print(f"\n*** Generated Cypher ***\n{cypher}")
+    cypher_cache.put(key, cypher)
+    await emit("cypher", {"question": question, "cypher": cypher, "cached": False})
+    return cypher
+
+async def query_graph(chain, cypher):
+    """Rows for a Cypher query, cached until the next ingest changes the graph version."""
+    if not cypher:
+        # The corrector returns an empty query when it does not fit the schema
+        return []
+    key = (cypher, graph_version())
+    rows = result_cache.get(key)
+    if rows is None:
+        rows = (await asyncio.to_thread(chain.graph.query, cypher))[:chain.top_k]
+        result_cache.put(key, rows)
+    await emit("rows", {"cypher": cypher, "count": len(rows)})
+    return rows
+
+async def answer_sub_query(chain, semaphore, sub_query, schema=None):
+    """
+    Answer one sub-query with the steps of the Cypher QA chain (generate Cypher, query, answer from the rows),
+    with the first two cached. Returns (answer, failed); a failure is reported in its answer instead of raised.
+    """
+    async with semaphore:
+        try:
+            cypher = await generate_cypher(chain, sub_query, schema)
+            rows = await query_graph(chain, cypher)
+            answer = await chain.qa_chain.ainvoke(
+                {"question": sub_query, "function_response": get_function_response(sub_query, rows)}
+            )
+            return answer, False
+        except Exception as e:
+            print(f"\n*** Error occurred while answering sub-query: {sub_query} ***\n", e)
+            return f"Could not answer '{sub_query}': {e}", True
 
-    graph = Neo4jGraph(url=NEO4J_URI, 
-                   username=NEO4J_USER, 
-                   password=NEO4J_PASSWORD,)
-                   #enhanced_schema=True,)
+async def translate_to_cypher(state):
+    
+    if not get_backend().supports_cypher:
+        message = "Free-form questions need the Neo4j graph backend (GRAPH_BACKEND=neo4j)."
+        print(message)
+        return {"final_results": [message]}
 
-    llm = ChatOpenAI(model=model_name, temperature=0, max_retries=1)
     queries = state["sub_query"][-1]
-    schema = state["neo4j_schema"][-1]
-    
-    CYPHER_GENERATION_PROMPT = PromptTemplate(
-        input_variables=["schema", "question"], template=CypherQueryTemplate
-    )
+    schema = state["neo4j_schema"][-1].content
+    query_results =[]
+    failed = False
     try:
-        chain = GraphCypherQAChain.from_llm(
-            llm=ChatOpenAI(temperature=0, model="gpt-4o-mini"), 
-            graph=graph, 
-            verbose=True, 
-            
-            qa_llm=ChatOpenAI(temperature=0, model="gpt-4o-mini"),
-            cypher_prompt = CYPHER_GENERATION_PROMPT,
-            
-            validate_cypher=True,
-            use_function_response=True,
-            function_response_system="Respond as a developer! Use provided data but must not make up the response.",
-            allow_dangerous_requests=True
+        chain = get_components().chain_for(schema)
+        sub_queries = [sub_query for sub_query in queries.content.split('\n') if sub_query.strip()]
+        # The Cypher prompt gets the part of the schema relevant to the question and its sub-queries
+        pruned_schema = prune_schema(schema, state["user_query"][-1].content + "\n" + queries.content)
+        # Independent sub-queries run concurrently (at most SUBQUERY_CONCURRENCY at a time), answers keep their order
+        semaphore = asyncio.Semaphore(int(os.getenv('SUBQUERY_CONCURRENCY', '3')))
+        answers = await asyncio.gather(
+            *(answer_sub_query(chain, semaphore, sub_query, pruned_schema) for sub_query in sub_queries)
         )
-        query_results =[]
-        sub_queries = queries.content.split('\n')
-        if len(sub_queries) == 1:
-            sub_queries = queries
-            result = chain.invoke({"query": sub_queries})
-            query_results.append(
-                result['result']
-            )
-            
-        else:
-            for sub_query in sub_queries:
-                result = chain.invoke({"query": sub_query})
-                query_results.append(
-                    result['result']
-                )
+        query_results = [answer for answer, _ in answers]
+        failed = any(sub_query_failed for _, sub_query_failed in answers)
     except Exception as e:
         print ("\n*** Error occurred while generating cypher ***\n", e)
+        query_results.append(f"Error occurred while generating cypher: {e}")
+        failed = True
     print("\n*** Generated the response ***\n")
     print(query_results)
-    return {"final_results": query_results}
+    # Failed answers (rate limits, timeouts) must not be cached as the answer to the question
+    return {"final_results": query_results, "failed": failed}
+
+_workflow = None
+_workflow_lock = threading.Lock()
+
+def get_workflow():
+    """The compiled workflow, built once per process; nodes look up their LLMs and chain per call."""
+    global _workflow
+    with _workflow_lock:
+        if _workflow is None:
+            _workflow = build_workflow()
+        return _workflow
 
 def build_workflow():
     memory = MemorySaver()
     workflow = StateGraph(AgentState)
 
-    workflow.add_edge(START, "neo4j_graph")
+    workflow.add_edge(START, "router")
+    workflow.add_node("router", router)
     workflow.add_node("neo4j_graph", neo4j_graph)
     workflow.add_node("simplifier", simplifier)
     workflow.add_node("translate_to_cypher", translate_to_cypher)
+    workflow.add_conditional_edges(
+    "router",
+    isFastPath,
+    {
+        "answered": END,
+        "llm": "neo4j_graph"}
+    )
     workflow.add_edge("neo4j_graph", "simplifier")
     
     workflow.add_conditional_edges(
@@ -0,0 +1,137 @@
+"""
+Offline bulk-import export of parser output for first-time ingestion of very large repositories.
+
+Writes node and relationship CSV files in the format of `neo4j-admin database import full`, one header file
+and one data file per label and per relationship type, streamed while the parser output is read:
+
+    python neo4j_import.py code_parser.jsonl import/ --database neo4j
+    neo4j-admin database import full neo4j --nodes=import/nodes_file_header.csv,import/nodes_file.csv ...
+
+The database must be stopped while importing, and the import replaces its content.
+"""
+import os
+import csv
+import sys
+import shlex
+import argparse
+import subprocess
+
+from code_graph import assign_entity_ids
+from code_parsing import read_entities
+from code_store import CodeStore
+from neo4j_lib import GRAPH_META_LABEL, NODE_PROPERTIES, new_graph_version
+
+
+class ImportExporter:
+    """
+    Streams entities into per-label node CSVs and per-type relationship CSVs under output_dir.
+    Nodes are deduplicated by id (the first occurrence wins, as with MERGE); CONTAINS edges come
+    from each node's parent_id and CALLS / IMPORTS from the relationship records.
+    """
+    def __init__(self, output_dir):
+        self.output_dir = output_dir
+        self.writers = {}   # file name -> (file, csv writer)
+        self.node_files = {}
+        self.relationship_files = {}
+        self.ids = set()
+        self.counts = {"nodes": {}, "relationships": {}, "duplicates": 0, "skipped": 0}
+
+    def _writer(self, name, header):
+        if name not in self.writers:
+            with open(os.path.join(self.output_dir, name + "_header.csv"), "w", encoding="utf-8", newline="") as f:
+                csv.writer(f).writerow(header)
+            f = open(os.path.join(self.output_dir, name + ".csv"), "w", encoding="utf-8", newline="")
+            self.writers[name] = (f, csv.writer(f))
+        return self.writers[name][1]
+
+    def add_node(self, entity):
+        label = entity["type"]
+        writer = self._writer(f"nodes_{label}", ["id:ID"] + list(NODE_PROPERTIES) + [":LABEL"])
+        writer.writerow([entity["id"]] + [entity.get(key) for key in NODE_PROPERTIES] + [label])
+        self.node_files[label] = f"nodes_{label}"
+        self.counts["nodes"][label] = self.counts["nodes"].get(label, 0) + 1
+
+    def add_graph_meta(self):
+        """The :GraphMeta node with a fresh version token, so API query caches drop results of the old database."""
+        writer = self._writer(f"nodes_{GRAPH_META_LABEL}", ["id:ID", "key", "version", ":LABEL"])
+        writer.writerow([f"{GRAPH_META_LABEL}:graph", "graph", new_graph_version(), GRAPH_META_LABEL])
+        self.node_files[GRAPH_META_LABEL] = f"nodes_{GRAPH_META_LABEL}"
+
+    def add_relationship(self, relationship, start_id, end_id):
+        writer = self._writer(f"relationships_{relationship}", [":START_ID", ":END_ID", ":TYPE"])
+        writer.writerow([start_id, end_id, relationship])
+        self.relationship_files[relationship] = f"relationships_{relationship}"
+        self.counts["relationships"][relationship] = self.counts["relationships"].get(relationship, 0) + 1
+
+    def export(self, entities, progress=None):
+        """Write every entity and relationship record; returns the per-label / per-type counts."""
+        os.makedirs(self.output_dir, exist_ok=True)
+        try:
+            for entity in assign_entity_ids(entities):
+                if entity.get("type") == "relationship":
+                    if entity.get("source_id") and entity.get("target_id"):
+                        self.add_relationship(entity["relationship"], entity["source_id"], entity["target_id"])
+                    else:
+                        self.counts["skipped"] += 1
+                    continue
+                if entity.get("path") is None:
+                    continue
+                if entity["id"] in self.ids:
+                    self.counts["duplicates"] += 1
+                    if progress:
+                        progress("nodes_written", 0, -1)
+                    continue
+                self.ids.add(entity["id"])
+                self.add_node(entity)
+                if entity.get("parent_id"):
+                    self.add_relationship("CONTAINS", entity["parent_id"], entity["id"])
+                if progress:
+                    progress("nodes_written")
+            self.add_graph_meta()
+        finally:
+            for f, _ in self.writers.values():
+                f.close()
+        return self.counts
+
+    def import_command(self, database="neo4j", admin="neo4j-admin"):
+        """Argument list for neo4j-admin database import full over the exported files."""
+        def files(name):
+            return ",".join(os.path.join(self.output_dir, name + suffix) for suffix in ("_header.csv", ".csv"))
+        command = [admin, "database", "import", "full", database, "--overwrite-destination",
+                   "--multiline-fields=true", "--skip-bad-relationships=true", "--skip-duplicate-nodes=true"]
+        command += [f"--nodes={files(name)}" for name in self.node_files.values()]
+        command += [f"--relationships={files(name)}" for name in self.relationship_files.values()]
+        return command
+
+
+def export_for_import(entities, output_dir, database="neo4j", progress=None):
+    """Export entities to output_dir and return (counts, import command as a shell string)."""
+    exporter = ImportExporter(output_dir)
+    counts = exporter.export(entities, progress=progress)
+    command = shlex.join(exporter.import_command(database, os.getenv("NEO4J_ADMIN", "neo4j-admin")))
+    print(f"Exported {sum(counts['nodes'].values())} nodes and {sum(counts['relationships'].values())} "
+          f"relationships to {output_dir}")
+    return counts, command
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export parser output as neo4j-admin import CSV files.")
+    parser.add_argument("parser_output", help="code_parser.json or code_parser.jsonl")
+    parser.add_argument("output_dir")
+    parser.add_argument("--database", default="neo4j")
+    parser.add_argument("--run", action="store_true", help="run the import (the database must be stopped)")
+    args = parser.parse_args()
+
+    code_store = CodeStore()
+    try:
+        counts, command = export_for_import(code_store.resolve_entities(read_entities(args.parser_output)),
+                                            args.output_dir, args.database)
+    finally:
+        code_store.close()
+    print(command)
+    if args.run:
+        sys.exit(subprocess.call(shlex.split(command)))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,15 +1,238 @@
 from neo4j import GraphDatabase
+from neo4j.exceptions import Neo4jError, DriverError
+from code_graph import assign_entity_ids
+from contextlib import contextmanager
+import os
 import json
+import re
+import time
+import random
+import threading
+import uuid
+import weakref
+import zlib
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+# Relationship types resolved by the parser, besides the CONTAINS hierarchy
+CODE_RELATIONSHIPS = ("CALLS", "IMPORTS")
+
+# Labels and relationship types are interpolated into Cypher, so only plain identifiers are accepted
+IDENTIFIER = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*$")
+
+# Every node label the parser emits; each is indexed by Neo4jLoader.ensure_schema
+NODE_LABELS = ("folder", "file", "file_code", "function", "function_code", "class", "class_code",
+               "method", "method_code", "summary", "import", "from_import")
+
+# Entity properties stored on every node besides id and label (Neo4jLoader, SQLite backend, import export)
+NODE_PROPERTIES = ("name", "path", "parent_name", "parent_type", "parent_id", "content_hash", "code", "docstring",
+                   "code_summary")
+
+# Label of the single node holding the graph version token (see Neo4jLoader.bump_graph_version)
+GRAPH_META_LABEL = "GraphMeta"
+
+# App-lifetime driver shared by the loader and the query path (init_driver at startup, close_driver at shutdown)
+_driver = None
+_driver_lock = threading.Lock()
+_session_lock = threading.Lock()
+session_counters = {"opened": 0, "active": 0, "failed": 0}
+# Labels whose indexes were already ensured through each driver (see Neo4jLoader.ensure_schema)
+_schema_ready = weakref.WeakKeyDictionary()
+_schema_lock = threading.Lock()
+
+
+def driver_config():
+    """Connection pool settings from the environment."""
+    return {
+        "max_connection_pool_size": int(os.getenv('NEO4J_MAX_POOL_SIZE', '50')),
+        "connection_acquisition_timeout": float(os.getenv('NEO4J_ACQUISITION_TIMEOUT', '60')),
+        "max_connection_lifetime": float(os.getenv('NEO4J_MAX_CONNECTION_LIFETIME', '3600')),
+    }
+
+
+def init_driver(uri=None, user=None, password=None):
+    """Create the shared driver (from NEO4J_URI / NEO4J_USER / NEO4J_PASSWORD unless given) if not created yet."""
+    global _driver
+    with _driver_lock:
+        if _driver is None:
+            _driver = GraphDatabase.driver(
+                uri or os.getenv('NEO4J_URI'),
+                auth=(user or os.getenv('NEO4J_USER'), password or os.getenv('NEO4J_PASSWORD')),
+                **driver_config()
+            )
+        return _driver
+
+
+def get_driver():
+    return _driver if _driver is not None else init_driver()
+
+
+def close_driver():
+    global _driver
+    with _driver_lock:
+        if _driver is not None:
+            _driver.close()
+            _driver = None
+
+
+@contextmanager
+def tracked_session(driver, **kwargs):
+    """driver.session(**kwargs), counted in session_counters."""
+    with _session_lock:
+        session_counters["opened"] += 1
+        session_counters["active"] += 1
+    try:
+        with driver.session(**kwargs) as session:
+            yield session
+    except Exception:
+        with _session_lock:
+            session_counters["failed"] += 1
+        raise
+    finally:
+        with _session_lock:
+            session_counters["active"] -= 1
+
+
+def pool_metrics():
+    """
+    Connection pool usage of the shared driver and session counters. The driver has no public pool
+    statistics, so they are read from its private pool (driver._pool.connections, as laid out in the
+    5.x and 6.x Python drivers); "pool" is None when a driver version does not expose it that way.
+    """
+    with _session_lock:
+        metrics = {"sessions": dict(session_counters)}
+    metrics.update(driver_config())
+    driver = _driver
+    pool = getattr(driver, "_pool", None)
+    connections = getattr(pool, "connections", None)
+    if driver is None or connections is None:
+        metrics["pool"] = None
+        return metrics
+    addresses = {}
+    for address, entries in list(connections.items()):
+        entries = list(entries)
+        in_use = sum(1 for connection in entries if getattr(connection, "in_use", False))
+        addresses[str(address)] = {"in_use": in_use, "idle": len(entries) - in_use}
+    metrics["pool"] = {
+        "in_use": sum(entry["in_use"] for entry in addresses.values()),
+        "idle": sum(entry["idle"] for entry in addresses.values()),
+        "addresses": addresses,
+    }
+    return metrics
+
+
+def partition_of(key, partitions):
+    """Stable partition (0..partitions-1) for a path or id."""
+    if partitions <= 1:
+        return 0
+    return zlib.crc32(key.encode('utf-8')) % partitions
+
+
+def is_retryable(error):
+    """Deadlocks and other transient server errors, and lost connections, are worth retrying."""
+    return isinstance(error, (Neo4jError, DriverError)) and error.is_retryable()
+
+
+def set_properties(node, prefix):
+    """SET assignments of every NODE_PROPERTIES key on node from prefix + key (e.g. "row." or "$")."""
+    return ", ".join(f"{node}.{key} = {prefix}{key}" for key in NODE_PROPERTIES)
+
+
+def new_graph_version():
+    """Opaque version token; every write stores a fresh one, so no two states of the graph share a version."""
+    return uuid.uuid4().hex
+
+
+def read_graph_version(driver):
+    """Version token stored on the :GraphMeta node, or None if the graph was never written with one."""
+    with tracked_session(driver) as session:
+        record = session.run(f"MATCH (m:{GRAPH_META_LABEL}) RETURN m.version AS version LIMIT 1").single()
+    return record["version"] if record else None
+
 
 class Neo4jLoader:
-    def __init__(self, uri, user, password):
+    def __init__(self, uri=None, user=None, password=None, driver=None):
+        """
+        Pass driver= to write through a shared driver (see get_driver); otherwise the loader opens
+        and owns its own driver for uri / user / password.
+        """
         self.uri = uri
         self.user = user
         self.password = password
-        self.driver = GraphDatabase.driver(uri, auth=(user, password))
+        self.owns_driver = driver is None
+        self.driver = driver if driver is not None else GraphDatabase.driver(uri, auth=(user, password))
 
     def close(self):
-        self.driver.close()
+        if self.owns_driver:
+            self.driver.close()
+
+    def session(self, **kwargs):
+        return tracked_session(self.driver, **kwargs)
+
+    def bump_graph_version(self):
+        """Store a new version token on the :GraphMeta node; query caches of every API worker are keyed by it."""
+        version = new_graph_version()
+        with self.session() as session:
+            session.run(f"MERGE (m:{GRAPH_META_LABEL} {{key: 'graph'}}) SET m.version = $version",
+                        version=version).consume()
+        return version
+
+    @contextmanager
+    def graph_write(self):
+        """Bump the graph version once the block ends, also when it fails part way through a write."""
+        try:
+            yield
+        finally:
+            try:
+                self.bump_graph_version()
+            except (Neo4jError, DriverError) as e:
+                print(f"Could not update the graph version: {e}")
+
+    def ensure_schema(self, labels=NODE_LABELS, wait_seconds=300, force=False):
+        """
+        Create the indexes behind the loader's lookups for every label: a uniqueness constraint on the entity id
+        (MERGE and edge creation), (name, path) and name indexes for queries and older relationship records,
+        and a path index for deleting the nodes of one file during sync.
+        Uses IF NOT EXISTS, so running it again is a no-op. Waits up to wait_seconds for the indexes to come online.
+        Runs once per driver: later calls for labels already ensured return None without touching the database
+        unless force=True (e.g. after the database was replaced by an offline import).
+        """
+        with _schema_lock:
+            ensured = _schema_ready.get(self.driver, frozenset())
+        if not force and ensured.issuperset(labels):
+            return None
+        with self.session() as session:
+            for label in labels:
+                if not IDENTIFIER.match(label):
+                    raise ValueError(f"Unsupported node label: {label}")
+                session.run(f"CREATE CONSTRAINT {label}_id IF NOT EXISTS FOR (n:{label}) REQUIRE n.id IS UNIQUE").consume()
+                session.run(
+                    f"CREATE INDEX {label}_name_path IF NOT EXISTS FOR (n:{label}) ON (n.name, n.path)"
+                ).consume()
+                session.run(f"CREATE INDEX {label}_name IF NOT EXISTS FOR (n:{label}) ON (n.name)").consume()
+                session.run(f"CREATE INDEX {label}_path IF NOT EXISTS FOR (n:{label}) ON (n.path)").consume()
+            if wait_seconds:
+                session.run("CALL db.awaitIndexes($seconds)", seconds=wait_seconds).consume()
+        with _schema_lock:
+            _schema_ready[self.driver] = _schema_ready.get(self.driver, frozenset()) | frozenset(labels)
+        return self.index_report(labels)
+
+    def index_report(self, labels=NODE_LABELS):
+        """State of the indexes on the code-graph labels (name, label, properties, state, population %)."""
+        query = """
+        SHOW INDEXES YIELD name, labelsOrTypes, properties, state, populationPercent, type
+        WHERE type = 'RANGE' AND any(label IN labelsOrTypes WHERE label IN $labels)
+        RETURN name, labelsOrTypes[0] AS label, properties, state, populationPercent
+        ORDER BY label, name
+        """
+        with self.session() as session:
+            report = [record.data() for record in session.run(query, labels=list(labels))]
+        online = sum(1 for index in report if index["state"] == "ONLINE")
+        print(f"Code graph indexes: {online}/{len(report)} online")
+        for index in report:
+            if index["state"] != "ONLINE":
+                print(f"  {index['name']} ({index['label']} {index['properties']}): "
+                      f"{index['state']} {index['populationPercent']}%")
+        return report
 
     def create_node(self, tx, node_type, properties):
         """
@@ -20,49 +243,460 @@ class Neo4jLoader:
                                 parent_type: $parent_type, code: $code, docstring: $docstring}})
         """
         query = f"""
-        MERGE (n:{node_type} {{name: $name, path: $path}})
-        ON CREATE SET n.parent_name = $parent_name, n.parent_type = $parent_type, 
-                      n.code = $code, n.docstring = $docstring, n.code_summary = $code_summary
-        ON MATCH SET n.parent_name = $parent_name, n.parent_type = $parent_type, 
-                     n.code = $code, n.docstring = $docstring, n.code_summary = $code_summary
+        MERGE (n:{node_type} {{id: $id}})
+        SET {set_properties("n", "$")}
         """
         tx.run(query, **properties)
 
-    def create_relationship(self, tx, parent_type, parent_name, child_type, child_name):
+    def create_relationship(self, tx, parent_type, parent_id, child_type, child_id):
         """
-        Create a relationship between the parent node and the child node.
+        Create a relationship between the parent node and the child node, both looked up by id.
         """
         query = f"""
-        MATCH (parent:{parent_type} {{name: $parent_name}})
-        MATCH (child:{child_type} {{name: $child_name}})
+        MATCH (parent:{parent_type} {{id: $parent_id}})
+        MATCH (child:{child_type} {{id: $child_id}})
         MERGE (parent)-[:CONTAINS]->(child)
         """
-        tx.run(query, parent_name=parent_name, child_name=child_name)
+        tx.run(query, parent_id=parent_id, child_id=child_id)
+
+    def create_link(self, tx, item):
+        """
+        Create a resolved code relationship (CALLS / IMPORTS) between two existing nodes.
+        """
+        query, row = self.link_query(item)
+        tx.run("WITH $row AS row " + query, row=row)
+
+    def link_query(self, item):
+        """
+        Query (over a "row" variable) and row parameters for a relationship record.
+        Records carry source_id / target_id; older
+        records without them are matched on (name, path).
+        """
+        relationship = item['relationship']
+        if relationship not in CODE_RELATIONSHIPS:
+            raise ValueError(f"Unsupported relationship type: {relationship}")
+        source_type, target_type = item['source_type'], item['target_type']
+        if not (IDENTIFIER.match(source_type) and IDENTIFIER.match(target_type)):
+            raise ValueError(f"Unsupported node label: {source_type} / {target_type}")
+        if item.get('source_id') and item.get('target_id'):
+            query = f"""
+            MATCH (source:{source_type} {{id: row.source_id}})
+            MATCH (target:{target_type} {{id: row.target_id}})
+            MERGE (source)-[:{relationship}]->(target)
+            """
+            row = {"source_id": item['source_id'], "target_id": item['target_id']}
+        else:
+            query = f"""
+            MATCH (source:{source_type} {{name: row.source_name, path: row.source_path}})
+            MATCH (target:{target_type} {{name: row.target_name, path: row.target_path}})
+            MERGE (source)-[:{relationship}]->(target)
+            """
+            row = {"source_name": item['source_name'], "source_path": item['source_path'],
+                   "target_name": item['target_name'], "target_path": item['target_path']}
+        return query, row
 
-    def load_data(self, data):
+    def load_data(self, data, progress=None, bulk=False, batch_size=1000, batches_per_transaction=1, writers=1):
         """
         Load data into Neo4j.
+        data can be any iterable of entities (e.g. code_parsing.read_entities over a JSONL file),
+        it is consumed one entity at a time. progress("nodes_written") is called per node written.
+        bulk=True writes nodes and relationships in UNWIND batches instead (see load_data_bulk), through
+        several concurrent sessions when writers > 1 (see load_data_parallel).
+        The label indexes are created first (see ensure_schema). Nodes are merged on their id; entities
+        from parser output written before ids existed get theirs assigned on the way (assign_entity_ids).
+        The graph version is bumped afterwards (see graph_write).
+        """
+        with self.graph_write():
+            self.ensure_schema()
+            data = assign_entity_ids(data)
+            if bulk and writers > 1:
+                return self.load_data_parallel(data, progress=progress, batch_size=batch_size, writers=writers)
+            if bulk:
+                return self.load_data_bulk(data, progress=progress, batch_size=batch_size,
+                                           batches_per_transaction=batches_per_transaction)
+            with self.session() as session:
+                for item in data:
+                    if item.get('type') == 'relationship':
+                        session.execute_write(self.create_link, item)
+                        continue
+                    path = item.get('path', None)
+                    if path is None: 
+                        print(f"Skipping node with missing path: {item}")
+                        continue
+                    # Create the current node
+                    properties = self.node_properties(item)
+                    session.execute_write(self.create_node, item['type'], properties)
+                    # Create relationship to the parent node
+                    if item['parent_id']:
+                        session.execute_write(self.create_relationship, item['parent_type'], item['parent_id'],
+                                              item['type'], item['id'])
+                    if progress:
+                        progress("nodes_written")
+            return "Nodes and Edges created successfully"
+
+
+
+    def node_properties(self, item):
+        return {"id": item['id'], **{key: item.get(key) for key in NODE_PROPERTIES}}
+
+    def node_batches(self, data, batch_size, edges, links, partitions=1):
+        """
+        Group node rows by label and partition and yield (partition, query, rows) once a group has batch_size rows.
+        Nodes are partitioned by file path, CONTAINS edges by parent id and CALLS/IMPORTS records by source,
+        so one partition's writes never touch another partition's nodes (see partition_of).
+        CONTAINS edges and CALLS/IMPORTS records are collected into edges/links for the second pass.
+        Progress is reported by the writers once a batch is committed, not here.
+        """
+        buffers = {}
+        for item in data:
+            if item.get('type') == 'relationship':
+                query, row = self.link_query(item)
+                partition = partition_of(item.get('source_id') or item['source_path'], partitions)
+                links.setdefault((query, partition), []).append(row)
+                continue
+            if item.get('path', None) is None:
+                print(f"Skipping node with missing path: {item}")
+                continue
+            label = item['type']
+            partition = partition_of(item['path'], partitions)
+            rows = buffers.setdefault((label, partition), [])
+            rows.append(self.node_properties(item))
+            if item['parent_id']:
+                edge_partition = partition_of(item['parent_id'], partitions)
+                edges.setdefault((item['parent_type'], label, edge_partition), []).append(
+                    {"parent_id": item['parent_id'], "child_id": item['id']}
+                )
+            if len(rows) >= batch_size:
+                yield partition, self.node_query(label), rows
+                buffers[(label, partition)] = []
+        for (label, partition), rows in buffers.items():
+            if rows:
+                yield partition, self.node_query(label), rows
+
+    def node_query(self, label):
+        if not IDENTIFIER.match(label):
+            raise ValueError(f"Unsupported node label: {label}")
+        return f"""
+        UNWIND $rows AS row
+        MERGE (n:{label} {{id: row.id}})
+        SET {set_properties("n", "row.")}
+        """
+
+    def contains_query(self, parent_type, child_type):
+        if not (IDENTIFIER.match(parent_type) and IDENTIFIER.match(child_type)):
+            raise ValueError(f"Unsupported node label: {parent_type} / {child_type}")
+        return f"""
+        UNWIND $rows AS row
+        MATCH (parent:{parent_type} {{id: row.parent_id}})
+        MATCH (child:{child_type} {{id: row.child_id}})
+        MERGE (parent)-[:CONTAINS]->(child)
+        """
+
+    def edge_batches(self, edges, links, batch_size):
+        """Yield (partition, query, rows) for the collected CONTAINS edges and CALLS/IMPORTS records."""
+        for (parent_type, child_type, partition), rows in edges.items():
+            query = self.contains_query(parent_type, child_type)
+            for start in range(0, len(rows), batch_size):
+                yield partition, query, rows[start:start + batch_size]
+        for (link_query, partition), rows in links.items():
+            query = "UNWIND $rows AS row " + link_query
+            for start in range(0, len(rows), batch_size):
+                yield partition, query, rows[start:start + batch_size]
+
+    def write_batches(self, session, batches, batches_per_transaction, progress=None):
+        """
+        Run (partition, query, rows) batches in explicit transactions, committing every batches_per_transaction
+        batches. Returns the number of rows written. progress("nodes_written", rows) is called after each commit.
         """
-        with self.driver.session() as session:
-            for item in data:
-                path = item.get('path', None)
-                if path is None: 
-                    print(f"Skipping node with missing path: {item}")
-                    continue
-                # Create the current node
-                properties = {
-                    "name": item['name'],
-                    "path": item.get('path', None),
-                    "parent_name": item['parent_name'],
-                    "parent_type": item['parent_type'],
-                    "code": item.get('code', None),
-                    "code_summary": item.get('code_summary', None),
-                    "docstring": item.get('docstring', None)
-                }
-                session.write_transaction(self.create_node, item['type'], properties)
-                # Create relationship to the parent node
-                if item['parent_name']:
-                    session.write_transaction(self.create_relationship, item['parent_type'], item['parent_name'], item['type'], item['name'])
+        written = 0
+        pending = 0
+        pending_rows = 0
+        tx = None
+        try:
+            for _, query, rows in batches:
+                if tx is None:
+                    tx = session.begin_transaction()
+                tx.run(query, rows=rows).consume()
+                written += len(rows)
+                pending += 1
+                pending_rows += len(rows)
+                if pending >= batches_per_transaction:
+                    tx.commit()
+                    tx = None
+                    pending = 0
+                    if progress:
+                        progress("nodes_written", pending_rows)
+                    pending_rows = 0
+            if tx is not None:
+                tx.commit()
+                tx = None
+                if progress:
+                    progress("nodes_written", pending_rows)
+        finally:
+            if tx is not None:
+                tx.rollback()
+        return written
+
+    def load_data_bulk(self, data, progress=None, batch_size=1000, batches_per_transaction=1):
+        """
+        Bulk load: nodes are grouped by label and MERGEd batch_size rows at a time with UNWIND $rows,
+        then CONTAINS and CALLS/IMPORTS relationships are created in a second batched pass, once every
+        node exists. Each transaction commits batches_per_transaction batches.
+        Timing and rows/sec for both passes are kept in self.load_stats.
+        """
+        batch_size = max(1, batch_size)
+        batches_per_transaction = max(1, batches_per_transaction)
+        edges = {}
+        links = {}
+        with self.session() as session:
+            start = time.perf_counter()
+            nodes = self.write_batches(
+                session, self.node_batches(data, batch_size, edges, links), batches_per_transaction, progress
+            )
+            node_seconds = time.perf_counter() - start
+            start = time.perf_counter()
+            relationships = self.write_batches(session, self.edge_batches(edges, links, batch_size),
+                                               batches_per_transaction)
+            relationship_seconds = time.perf_counter() - start
+        self.load_stats = {
+            "nodes": nodes,
+            "node_seconds": round(node_seconds, 3),
+            "nodes_per_sec": round(nodes / node_seconds, 1) if node_seconds else None,
+            "relationships": relationships,
+            "relationship_seconds": round(relationship_seconds, 3),
+            "relationships_per_sec": round(relationships / relationship_seconds, 1) if relationship_seconds else None,
+        }
+        print(f"Bulk load: {nodes} nodes in {node_seconds:.2f}s ({self.load_stats['nodes_per_sec']} rows/sec), "
+              f"{relationships} relationships in {relationship_seconds:.2f}s "
+              f"({self.load_stats['relationships_per_sec']} rows/sec)")
         return "Nodes and Edges created successfully"
 
+    def write_batch_with_retry(self, query, rows, max_retries=5, base_delay=0.2, max_delay=10.0, progress=None):
+        """
+        Write one batch in its own session and transaction. Deadlocks and other retryable errors are
+        retried with exponential backoff and jitter; returns the number of retries that were needed.
+        progress("nodes_written", rows) is called once the batch is committed.
+        """
+        for attempt in range(max_retries + 1):
+            try:
+                with self.session() as session:
+                    with session.begin_transaction() as tx:
+                        tx.run(query, rows=rows).consume()
+                        tx.commit()
+            except Exception as e:
+                if attempt == max_retries or not is_retryable(e):
+                    raise
+                delay = min(max_delay, base_delay * 2 ** attempt) * (0.5 + random.random())
+                print(f"Retrying batch of {len(rows)} rows in {delay:.2f}s after: {e}")
+                time.sleep(delay)
+                continue
+            if progress:
+                progress("nodes_written", len(rows))
+            return attempt
+
+    def write_partitioned(self, executors, batches, max_pending, progress=None):
+        """
+        Run (partition, query, rows) batches on the single-threaded executor of their partition, so batches
+        of one partition run in order while partitions run concurrently. At most max_pending batches are
+        queued at a time. Returns (rows written, retries). progress is passed on to write_batch_with_retry.
+        """
+        pending = set()
+        written = 0
+        retries = 0
+
+        def collect(done):
+            nonlocal written, retries
+            for future in done:
+                count, retried = future.result()
+                written += count
+                retries += retried
+
+        def run(query, rows):
+            return len(rows), self.write_batch_with_retry(query, rows, progress=progress)
+
+        try:
+            for partition, query, rows in batches:
+                if len(pending) >= max_pending:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    collect(done)
+                pending.add(executors[partition].submit(run, query, rows))
+            done, pending = wait(pending)
+            collect(done)
+        finally:
+            for future in pending:
+                future.cancel()
+        return written, retries
+
+    def load_data_parallel(self, data, progress=None, batch_size=1000, writers=4):
+        """
+        Parallel load: node batches are split by label and by file partition (hash of the path % writers)
+        and written through `writers` concurrent sessions, one per partition. Relationships are written the
+        same way once every node batch has committed, so both ends of each edge exist. Retryable errors such
+        as deadlocks are retried with backoff per batch. Timing, rows/sec and retries are kept in self.load_stats.
+        """
+        batch_size = max(1, batch_size)
+        writers = max(1, writers)
+        edges = {}
+        links = {}
+        executors = [ThreadPoolExecutor(max_workers=1, thread_name_prefix=f"writer-{i}") for i in range(writers)]
+        try:
+            start = time.perf_counter()
+            nodes, node_retries = self.write_partitioned(
+                executors, self.node_batches(data, batch_size, edges, links, partitions=writers), writers * 2,
+                progress
+            )
+            node_seconds = time.perf_counter() - start
+            start = time.perf_counter()
+            relationships, relationship_retries = self.write_partitioned(
+                executors, self.edge_batches(edges, links, batch_size), writers * 2
+            )
+            relationship_seconds = time.perf_counter() - start
+        finally:
+            for executor in executors:
+                executor.shutdown(cancel_futures=True)
+        self.load_stats = {
+            "writers": writers,
+            "nodes": nodes,
+            "node_seconds": round(node_seconds, 3),
+            "nodes_per_sec": round(nodes / node_seconds, 1) if node_seconds else None,
+            "relationships": relationships,
+            "relationship_seconds": round(relationship_seconds, 3),
+            "relationships_per_sec": round(relationships / relationship_seconds, 1) if relationship_seconds else None,
+            "retries": node_retries + relationship_retries,
+        }
+        print(f"Parallel load ({writers} writers): {nodes} nodes in {node_seconds:.2f}s "
+              f"({self.load_stats['nodes_per_sec']} rows/sec), {relationships} relationships in "
+              f"{relationship_seconds:.2f}s ({self.load_stats['relationships_per_sec']} rows/sec), "
+              f"{self.load_stats['retries']} retries")
+        return "Nodes and Edges created successfully"
+
+    def stored_hashes(self, session, root_path):
+        """path -> content_hash of the file nodes and the set of folder paths stored under root_path."""
+        params = {"root": root_path, "prefix": root_path.rstrip(os.sep) + os.sep}
+        files = {
+            record["path"]: record["hash"] for record in session.run(
+                "MATCH (f:file) WHERE f.path STARTS WITH $prefix "
+                "RETURN f.path AS path, f.content_hash AS hash", **params
+            )
+        }
+        folders = {
+            record["path"] for record in session.run(
+                "MATCH (f:folder) WHERE f.path = $root OR f.path STARTS WITH $prefix RETURN f.path AS path", **params
+            )
+        }
+        return files, folders
+
+    def delete_file(self, tx, path):
+        """Detach-delete every node extracted from the file at path."""
+        for label in NODE_LABELS:
+            if label != "folder":
+                tx.run(f"MATCH (n:{label} {{path: $path}}) DETACH DELETE n", path=path).consume()
+
+    def delete_folder(self, tx, path):
+        tx.run("MATCH (n:folder {path: $path}) DETACH DELETE n", path=path).consume()
+
+    def replace_file(self, tx, path, entities):
+        """Delete the nodes of one file and write its new nodes and CONTAINS edges, in the caller's transaction."""
+        self.delete_file(tx, path)
+        nodes = {}
+        edges = {}
+        for item in entities:
+            nodes.setdefault(item['type'], []).append(self.node_properties(item))
+            if item['parent_id']:
+                edges.setdefault((item['parent_type'], item['type']), []).append(
+                    {"parent_id": item['parent_id'], "child_id": item['id']}
+                )
+        for label, rows in nodes.items():
+            tx.run(self.node_query(label), rows=rows).consume()
+        for (parent_type, child_type), rows in edges.items():
+            tx.run(self.contains_query(parent_type, child_type), rows=rows).consume()
+
+    def write_folder(self, tx, item):
+        tx.run(self.node_query("folder"), rows=[self.node_properties(item)]).consume()
+        if item['parent_id']:
+            tx.run(self.contains_query(item['parent_type'], "folder"),
+                   rows=[{"parent_id": item['parent_id'], "child_id": item['id']}]).consume()
+
+    def sync_data(self, data, progress=None, batch_size=1000):
+        """
+        Differential sync: compare the content_hash of every file in the parser output with the one stored
+        on its file node and rewrite only files that are new or changed, one transaction per file (delete
+        the file's nodes, insert the new ones and their CONTAINS edges). Files and folders under the parsed
+        root that are no longer in the output are deleted. CALLS/IMPORTS records are re-applied only when
+        they touch a changed file, since deleting a file's nodes also dropped their edges.
+        The root is the first folder in the output. Counts are kept in self.load_stats. The graph version is
+        bumped afterwards (see graph_write).
+        """
+        with self.graph_write():
+            self.ensure_schema()
+            started = time.perf_counter()
+            stats = {"files_added": 0, "files_changed": 0, "files_unchanged": 0, "files_removed": 0,
+                     "folders_removed": 0, "nodes": 0, "relationships": 0}
+            changed = set()
+            seen_files = set()
+            seen_folders = set()
+            links = {}
+            stored_files, stored_folders = {}, set()
+            with self.session() as session:
+
+                def flush(path, entities, content_hash):
+                    if path is None:
+                        return
+                    seen_files.add(path)
+                    if content_hash and stored_files.get(path) == content_hash:
+                        stats["files_unchanged"] += 1
+                        if progress:
+                            # Not rewritten, so not part of the nodes to write
+                            progress("nodes_written", 0, -len(entities))
+                        return
+                    stats["files_changed" if path in stored_files else "files_added"] += 1
+                    changed.add(path)
+                    session.execute_write(self.replace_file, path, entities)
+                    stats["nodes"] += len(entities)
+                    if progress:
+                        progress("nodes_written", len(entities))
+
+                root_path = None
+                current_path, current_entities, current_hash = None, [], None
+                for item in assign_entity_ids(data):
+                    item_type = item.get('type')
+                    if item_type in ('relationship', 'folder') and current_path is not None:
+                        # A file's entities end at the next non-file record; relationship records follow all
+                        # files, so the last file must be written (and marked changed) before they are checked
+                        flush(current_path, current_entities, current_hash)
+                        current_path, current_entities, current_hash = None, [], None
+                    if item_type == 'relationship':
+                        if item['source_path'] in changed or item['target_path'] in changed:
+                            query, row = self.link_query(item)
+                            links.setdefault((query, 0), []).append(row)
+                        continue
+                    if item.get('path', None) is None:
+                        continue
+                    if item_type == 'folder':
+                        if root_path is None:
+                            root_path = item['path']
+                            stored_files, stored_folders = self.stored_hashes(session, root_path)
+                        seen_folders.add(item['path'])
+                        if item['path'] not in stored_folders:
+                            session.execute_write(self.write_folder, item)
+                        continue
+                    if item_type == 'file':
+                        flush(current_path, current_entities, current_hash)
+                        current_path, current_entities, current_hash = item['path'], [], item.get('content_hash')
+                    current_entities.append(item)
+                flush(current_path, current_entities, current_hash)
+
+                if root_path is None:
+                    print("Sync: no root folder in the parser output, removed files are not detected")
+                for path in set(stored_files) - seen_files:
+                    session.execute_write(self.delete_file, path)
+                    stats["files_removed"] += 1
+                for path in stored_folders - seen_folders:
+                    session.execute_write(self.delete_folder, path)
+                    stats["folders_removed"] += 1
+                stats["relationships"] = self.write_batches(session, self.edge_batches({}, links, batch_size), 1)
 
+            stats["seconds"] = round(time.perf_counter() - started, 3)
+            self.load_stats = stats
+            print(f"Sync: {stats}")
+            return "Nodes and Edges synced successfully"
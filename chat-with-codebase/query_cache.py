@@ -0,0 +1,77 @@
+import os
+import re
+import time
+import threading
+from collections import OrderedDict
+
+
+def normalize_question(text):
+    """Cache key form of a question: lower case, single spaces, no trailing punctuation."""
+    return re.sub(r"\s+", " ", str(text)).strip().rstrip("?.! ").lower()
+
+
+class QueryCache:
+    """
+    In-memory LRU cache with a TTL for the question path. At most max_entries are kept (least recently
+    used are dropped first) and entries older than ttl seconds are treated as missing.
+    """
+    def __init__(self, name, max_entries=256, ttl=3600):
+        self.name = name
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None or time.time() - entry[1] >= self.ttl:
+                if entry is not None:
+                    del self.entries[key]
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key, value):
+        with self.lock:
+            self.entries[key] = (value, time.time())
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def stats(self):
+        with self.lock:
+            total = self.hits + self.misses
+            return {
+                "entries": len(self.entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / total, 4) if total else 0.0,
+            }
+
+
+def make_cache(name):
+    return QueryCache(name, max_entries=int(os.getenv('QUERY_CACHE_SIZE', '256')),
+                      ttl=float(os.getenv('QUERY_CACHE_TTL', '3600')))
+
+
+# Normalized (sub-)question + schema -> generated Cypher; the graph schema, not its content, decides the query
+cypher_cache = make_cache("cypher")
+# (Cypher, graph version) -> result rows
+result_cache = make_cache("results")
+# (normalized question, graph version) -> final workflow answer
+answer_cache = make_cache("answers")
+
+
+def query_cache_stats():
+    return {cache.name: cache.stats() for cache in (cypher_cache, result_cache, answer_cache)}
@@ -0,0 +1,86 @@
+"""
+Fast path for the common /ask_code questions: recognizes the question patterns of the Cypher prompt
+examples and answers them with the parameterized query templates of graph_backend, without LLM calls.
+Questions that match no pattern, or whose template returns no rows, go through the LLM workflow.
+"""
+import re
+import threading
+
+# Template name -> patterns matched (case-insensitive, whole question) against the question; named
+# groups are the template parameters
+QUOTED = r"['\"`]?"
+ROUTES = {
+    "functions_per_file": [
+        r"(?:how many|count(?: of)?|number of) (?:methods or )?(?:functions?|methods?)(?: are there)?"
+        r" (?:for|in|per) (?:each|every|a)? ?(?:python )?files?",
+    ],
+    "file_code": [
+        r"(?:show|give|get|retrieve|display|print|what is)(?: me)?(?: the)? (?:source )?code (?:of|for|in)"
+        r" (?:the )?(?:file )?(?:named |called )?" + QUOTED + r"(?P<file_name>[\w.\-]+\.\w+)" + QUOTED,
+    ],
+    "class_methods": [
+        r"(?:list|show|get|give|what are|which are)(?: me)?(?: all)?(?: the)? methods (?:of|in|for)"
+        r" (?:the )?class (?:named |called )?" + QUOTED + r"(?P<class_name>\w+)" + QUOTED +
+        r"(?: (?:with|and) (?:their )?summar(?:y|ies))?",
+    ],
+    "callers": [
+        r"(?:who|what|which (?:functions?|methods?)(?: or (?:functions?|methods?))?) calls? (?:the )?"
+        r"(?:function |method )?" + QUOTED + r"(?P<function_name>\w+)" + QUOTED + r"(?:\(\))?",
+    ],
+    "file_imports": [
+        r"(?:which|what) files? imports? (?:the file )?" + QUOTED + r"(?P<file_name>[\w.\-]+\.py)" + QUOTED,
+    ],
+}
+COMPILED_ROUTES = [
+    (name, re.compile(pattern, re.IGNORECASE)) for name, patterns in ROUTES.items() for pattern in patterns
+]
+
+
+def route_question(question):
+    """(template name, params) for a question matching a fast-path pattern, or None."""
+    text = " ".join(str(question).split()).rstrip("?.! ")
+    for name, pattern in COMPILED_ROUTES:
+        match = pattern.fullmatch(text)
+        if match:
+            return name, match.groupdict()
+    return None
+
+
+def format_rows(rows):
+    """Plain-text answer from template rows: one 'column: value' line per column, rows separated by a blank line."""
+    return "\n\n".join("\n".join(f"{key}: {value}" for key, value in row.items()) for row in rows)
+
+
+class RouterStats:
+    """Counts of questions answered by the fast path, matched without rows, and sent to the LLM path."""
+    def __init__(self):
+        self.hits = 0
+        self.empty = 0
+        self.misses = 0
+        self.per_template = {}
+        self.lock = threading.Lock()
+
+    def record(self, name=None, rows=0):
+        with self.lock:
+            if name is None:
+                self.misses += 1
+            elif rows:
+                self.hits += 1
+                self.per_template[name] = self.per_template.get(name, 0) + 1
+            else:
+                self.empty += 1
+
+    def stats(self):
+        with self.lock:
+            total = self.hits + self.empty + self.misses
+            return {
+                "questions": total,
+                "hits": self.hits,
+                "matched_without_rows": self.empty,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / total, 4) if total else 0.0,
+                "per_template": dict(self.per_template),
+            }
+
+
+router_stats = RouterStats()
@@ -0,0 +1,147 @@
+"""
+Question-relevant subset of the graph schema for the simplifier and Cypher prompts.
+
+Labels, relationship types and properties of a schema in the Neo4jGraph.schema layout are scored against
+the words of the question (lexical overlap on singularized, snake_case-split tokens plus a few code-graph
+synonyms, no embeddings). Identifiers in the question (snake_case, camelCase or quoted names) are the
+entities asked about, so they are not scored. Matching labels keep all their properties, their neighbours
+are added with the matching properties only, and relationships between kept labels follow, best first,
+until the token budget (SCHEMA_TOKEN_BUDGET, estimated at 4 characters per token) is spent.
+"""
+import os
+import re
+
+# Question words that refer to schema names spelled differently
+SYNONYMS = {
+    "caller": "call", "callee": "call", "invoke": "call", "use": "call",
+    "depend": "import", "dependency": "import",
+    "directory": "folder", "dir": "folder", "module": "file", "script": "file",
+    "source": "code", "implementation": "code", "body": "code",
+    "explain": "summary", "describe": "summary", "description": "summary", "purpose": "summary",
+    "doc": "docstring", "documentation": "docstring",
+    "contain": "contain", "inside": "contain", "member": "contain",
+}
+# Properties kept on neighbour labels whatever the question says
+CORE_PROPERTIES = {"name", "path"}
+NODE_LINE = re.compile(r"^(\w+) \{(.*)\}$")
+RELATIONSHIP_LINE = re.compile(r"^\(:(\w+)\)-\[:(\w+)\]->\(:(\w+)\)$")
+# Code names in a question: quoted words, snake_case and camelCase / PascalCase identifiers
+QUESTION_IDENTIFIER = re.compile(r"(['\"`])[^'\"`\s]+\1|\b\w*_\w*\b|\b\w*[a-z0-9][A-Z]\w*\b")
+
+
+def singular(word):
+    if word.endswith("ies") and len(word) > 4:
+        return word[:-3] + "y"
+    if word.endswith(("sses", "ches", "shes", "xes")):
+        return word[:-2]
+    if word.endswith("s") and not word.endswith("ss") and len(word) > 3:
+        return word[:-1]
+    return word
+
+
+def tokens(text):
+    """Lower-case singular word set of a question or schema name (camelCase and snake_case are split)."""
+    text = re.sub(r"([a-z0-9])([A-Z])", r"\1 \2", str(text))
+    words = {singular(word) for word in re.findall(r"[a-z0-9]+", text.lower())}
+    return words | {SYNONYMS[word] for word in words if word in SYNONYMS}
+
+
+def question_tokens(question):
+    """tokens() of a question without the identifiers it names, e.g. generate_code_summary or CodeStore."""
+    return tokens(QUESTION_IDENTIFIER.sub(" ", str(question)))
+
+
+def overlap(name, words):
+    """Share of a schema name's tokens that appear in the question words."""
+    name_tokens = tokens(name)
+    return len(name_tokens & words) / len(name_tokens) if name_tokens else 0.0
+
+
+def parse_schema(schema):
+    """(node properties by label, relationship property lines by type, relationship triples) of a schema string."""
+    nodes, relationship_properties, relationships = {}, {}, []
+    section = None
+    for line in schema.splitlines():
+        line = line.strip()
+        if line == "Node properties:":
+            section = "nodes"
+        elif line == "Relationship properties:":
+            section = "relationship_properties"
+        elif line == "The relationships:":
+            section = "relationships"
+        elif section == "relationships" and RELATIONSHIP_LINE.match(line):
+            relationships.append(RELATIONSHIP_LINE.match(line).groups())
+        elif section in ("nodes", "relationship_properties") and NODE_LINE.match(line):
+            name, properties = NODE_LINE.match(line).groups()
+            properties = [prop.strip() for prop in properties.split(",") if prop.strip()]
+            if section == "nodes":
+                nodes[name] = properties
+            else:
+                relationship_properties[name] = line
+    return nodes, relationship_properties, relationships
+
+
+def estimate_tokens(text):
+    return len(text) // 4 + 1
+
+
+def prune_schema(schema, question, budget=None):
+    """
+    Schema string with only the labels, relationships and properties relevant to question, within budget
+    tokens. When nothing matches, every label is kept (with its core properties) so irrelevant questions
+    can still be explained; a schema not in the Neo4jGraph layout is returned unchanged.
+    """
+    if budget is None:
+        budget = int(os.getenv("SCHEMA_TOKEN_BUDGET", "800"))
+    nodes, relationship_properties, relationships = parse_schema(schema)
+    if not nodes:
+        return schema
+    words = question_tokens(question)
+
+    direct = {label: overlap(label, words) for label in nodes}
+    type_scores = {rel_type: overlap(rel_type, words) for _, rel_type, _ in relationships}
+    # Neighbours of matching labels score by how well the label and the connecting relationship match
+    label_scores = dict(direct)
+    for source, rel_type, target in relationships:
+        for label, other in ((source, target), (target, source)):
+            if label in nodes and other in nodes:
+                label_scores[label] = max(label_scores[label], 0.5 * direct[other] + 0.25 * type_scores[rel_type])
+    order = list(nodes)
+    ranked = sorted(order, key=lambda label: (-label_scores[label], order.index(label)))
+    if label_scores[ranked[0]]:
+        ranked = [label for label in ranked if label_scores[label]]
+
+    lines = ["Node properties:"]
+    used = estimate_tokens("Node properties:\nRelationship properties:\nThe relationships:")
+    kept = set()
+    for label in ranked:
+        if direct[label]:
+            properties = nodes[label]
+        else:
+            properties = [prop for prop in nodes[label]
+                          if prop.split(":")[0] in CORE_PROPERTIES or overlap(prop.split(":")[0], words)]
+        line = f"{label} {{{', '.join(properties)}}}"
+        if used + estimate_tokens(line) > budget and kept:
+            break
+        lines.append(line)
+        used += estimate_tokens(line)
+        kept.add(label)
+
+    candidates = [triple for triple in relationships if triple[0] in kept and triple[2] in kept]
+    matched = [triple for triple in candidates if type_scores[triple[1]] or direct[triple[0]] or direct[triple[2]]]
+    candidates = matched or candidates
+    candidates.sort(key=lambda triple: -(type_scores[triple[1]] + label_scores[triple[0]] + label_scores[triple[2]]))
+    relationship_lines = []
+    for source, rel_type, target in candidates:
+        line = f"(:{source})-[:{rel_type}]->(:{target})"
+        if used + estimate_tokens(line) > budget:
+            break
+        relationship_lines.append(line)
+        used += estimate_tokens(line)
+    kept_types = {line.split("[:")[1].split("]")[0] for line in relationship_lines}
+
+    lines.append("Relationship properties:")
+    lines += [line for rel_type, line in relationship_properties.items() if rel_type in kept_types]
+    lines.append("The relationships:")
+    lines += sorted(relationship_lines)
+    return "\n".join(lines)
@@ -0,0 +1,190 @@
+import asyncio
+import json
+import random
+import time
+
+from openai import APIStatusError
+
+
+def estimate_tokens(messages, completion_tokens=300):
+    """Rough token estimate (~4 characters per token) used for tokens/min budgeting."""
+    return sum(len(message["content"]) for message in messages) // 4 + completion_tokens
+
+
+# Structured output for batched prompts: one summary per entity id
+BATCH_RESPONSE_FORMAT = {
+    "type": "json_schema",
+    "json_schema": {
+        "name": "code_summaries",
+        "strict": True,
+        "schema": {
+            "type": "object",
+            "properties": {
+                "summaries": {
+                    "type": "array",
+                    "items": {
+                        "type": "object",
+                        "properties": {
+                            "id": {"type": "string"},
+                            "summary": {"type": "string"},
+                        },
+                        "required": ["id", "summary"],
+                        "additionalProperties": False,
+                    },
+                },
+            },
+            "required": ["summaries"],
+            "additionalProperties": False,
+        },
+    },
+}
+
+
+class TokenBucket:
+    """
+    Token bucket refilled continuously at rate_per_minute and holding at most one minute's worth.
+    A rate of None or 0 disables the limit.
+    """
+    def __init__(self, rate_per_minute):
+        self.capacity = rate_per_minute or 0
+        self.tokens = self.capacity
+        self.rate = self.capacity / 60.0
+        self.updated = time.monotonic()
+        self.lock = asyncio.Lock()
+
+    async def acquire(self, amount=1):
+        if not self.rate:
+            return
+        amount = min(amount, self.capacity)
+        async with self.lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= amount:
+                    self.tokens -= amount
+                    return
+                await asyncio.sleep((amount - self.tokens) / self.rate)
+
+
+class SummaryEngine:
+    """
+    Sends summary requests through one shared async client with bounded concurrency,
+    requests/min and tokens/min token buckets, and exponential backoff on 429s.
+    """
+    def __init__(self, client, model_name, concurrency=8, requests_per_minute=None, tokens_per_minute=None,
+                 max_retries=6, max_backoff=60.0):
+        self.client = client
+        self.model_name = model_name
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.request_bucket = TokenBucket(requests_per_minute)
+        self.token_bucket = TokenBucket(tokens_per_minute)
+        self.max_retries = max_retries
+        self.max_backoff = max_backoff
+        self.calls = 0
+        self.retries = 0
+        self.failures = 0
+        self.batches = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+
+    async def complete(self, messages, **kwargs):
+        """Run one chat completion under the concurrency and rate limits, retrying on rate-limit errors."""
+        tokens = estimate_tokens(messages)
+        for attempt in range(self.max_retries + 1):
+            await self.request_bucket.acquire(1)
+            await self.token_bucket.acquire(tokens)
+            async with self.semaphore:
+                try:
+                    self.calls += 1
+                    response = await self.client.chat.completions.create(
+                        model=self.model_name,
+                        messages=messages,
+                        **kwargs
+                    )
+                    usage = getattr(response, "usage", None)
+                    if usage is not None:
+                        self.prompt_tokens += usage.prompt_tokens or 0
+                        self.completion_tokens += usage.completion_tokens or 0
+                    return response.choices[0].message.content
+                except APIStatusError as e:
+                    if e.status_code not in (429, 500, 502, 503) or attempt == self.max_retries:
+                        raise
+                    delay = self.retry_delay(e, attempt)
+            self.retries += 1
+            # Back off outside the semaphore so other requests are not blocked
+            await asyncio.sleep(delay)
+
+    def retry_delay(self, error, attempt):
+        response = getattr(error, "response", None)
+        retry_after = response.headers.get("retry-after") if response is not None else None
+        try:
+            return min(self.max_backoff, float(retry_after))
+        except (TypeError, ValueError):
+            return min(self.max_backoff, (2 ** attempt) + random.random())
+
+    async def summarize_one(self, key, messages, on_complete):
+        try:
+            summary = await self.complete(messages)
+        except Exception as e:
+            self.failures += 1
+            print(f"Error generating summary: {e}")
+            return
+        on_complete(key, summary)
+
+    async def summarize_batch(self, messages, members, on_complete):
+        """
+        Summarize several entities with one structured-output request. members maps the entity id used
+        in the prompt to (key, single_messages); ids missing from the reply fall back to single requests.
+        """
+        self.batches += 1
+        try:
+            content = await self.complete(messages, response_format=BATCH_RESPONSE_FORMAT)
+            summaries = {item["id"]: item["summary"] for item in json.loads(content)["summaries"]}
+        except Exception as e:
+            print(f"Error generating batched summary, falling back to single requests: {e}")
+            summaries = {}
+        fallback = []
+        for entity_id, (key, single_messages) in members.items():
+            if summaries.get(entity_id):
+                on_complete(key, summaries[entity_id])
+            else:
+                fallback.append((key, single_messages))
+        await asyncio.gather(*(self.summarize_one(key, m, on_complete) for key, m in fallback))
+
+    async def summarize_all(self, items, on_complete, batches=()):
+        """
+        Summarize (key, messages) items and (messages, members) batches concurrently.
+        on_complete(key, summary) is called as each one finishes; failed items are reported and get no summary.
+        """
+        await asyncio.gather(
+            *(self.summarize_one(key, messages, on_complete) for key, messages in items),
+            *(self.summarize_batch(messages, members, on_complete) for messages, members in batches),
+        )
+
+    def stats(self):
+        return {
+            "calls": self.calls,
+            "batches": self.batches,
+            "retries": self.retries,
+            "failures": self.failures,
+            "prompt_tokens": self.prompt_tokens,
+            "completion_tokens": self.completion_tokens,
+        }
+
+
+def run_summary_requests(client, model_name, items, on_complete, concurrency=8, requests_per_minute=None,
+                         tokens_per_minute=None, batches=()):
+    """
+    Synchronous entry point: run the engine over items on a fresh event loop and close the client afterwards.
+    """
+    async def main():
+        engine = SummaryEngine(client, model_name, concurrency=concurrency,
+                               requests_per_minute=requests_per_minute, tokens_per_minute=tokens_per_minute)
+        try:
+            await engine.summarize_all(items, on_complete, batches=batches)
+        finally:
+            await client.close()
+        return engine.stats()
+
+    return asyncio.run(main())
@@ -0,0 +1,139 @@
+import os
+import time
+import sqlite3
+import hashlib
+import threading
+
+
+class SummaryCache:
+    """
+    On-disk (SQLite) cache of code summaries keyed by hash(code segment, model name, prompt version).
+    The cache is bounded by the total size of the stored summaries; least recently used
+    entries are evicted first. Hit/miss counters are kept for the lifetime of the instance.
+    LRU touches of cache hits are kept in memory and written in one transaction (on put, stats, close,
+    or every TOUCH_BATCH hits), so a fully cached re-run does not commit once per entity.
+    """
+    TOUCH_BATCH = 1000
+
+    def __init__(self, db_path, max_bytes=256 * 1024 * 1024):
+        self.db_path = db_path
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.touched = {}  # key -> last_used not yet written
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(db_path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        # In WAL mode NORMAL only syncs at checkpoints; a crash can lose recent entries, never corrupt the cache
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS summaries ("
+            "key TEXT PRIMARY KEY, summary TEXT, size INTEGER, last_used REAL)"
+        )
+        self.conn.execute("CREATE INDEX IF NOT EXISTS summaries_last_used ON summaries(last_used)")
+        self.conn.commit()
+        self.total_bytes = self.conn.execute("SELECT COALESCE(SUM(size), 0) FROM summaries").fetchone()[0]
+
+    @staticmethod
+    def make_key(source_code, model_name, prompt_version):
+        digest = hashlib.sha256()
+        for part in (prompt_version, model_name, source_code):
+            digest.update(str(part).encode("utf-8"))
+            digest.update(b"\0")
+        return digest.hexdigest()
+
+    def get(self, key):
+        """Return the cached summary or None, refreshing its LRU position on a hit."""
+        with self.lock:
+            row = self.conn.execute("SELECT summary FROM summaries WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.touched[key] = time.time()
+            if len(self.touched) >= self.TOUCH_BATCH:
+                self._flush_touches()
+                self.conn.commit()
+            return row[0]
+
+    def _flush_touches(self):
+        if self.touched:
+            self.conn.executemany(
+                "UPDATE summaries SET last_used = ? WHERE key = ?",
+                [(last_used, key) for key, last_used in self.touched.items()],
+            )
+            self.touched.clear()
+
+    def put(self, key, summary):
+        if summary is None:
+            return
+        size = len(summary.encode("utf-8"))
+        with self.lock:
+            # Recent hits must be visible to the eviction order
+            self._flush_touches()
+            old = self.conn.execute("SELECT size FROM summaries WHERE key = ?", (key,)).fetchone()
+            if old is not None:
+                self.total_bytes -= old[0]
+            self.conn.execute(
+                "INSERT OR REPLACE INTO summaries (key, summary, size, last_used) VALUES (?, ?, ?, ?)",
+                (key, summary, size, time.time()),
+            )
+            self.total_bytes += size
+            self._evict()
+            self.conn.commit()
+
+    def _evict(self):
+        while self.total_bytes > self.max_bytes:
+            rows = self.conn.execute(
+                "SELECT key, size FROM summaries ORDER BY last_used LIMIT 100"
+            ).fetchall()
+            if not rows:
+                self.total_bytes = 0
+                return
+            for key, size in rows:
+                if self.total_bytes <= self.max_bytes:
+                    break
+                self.conn.execute("DELETE FROM summaries WHERE key = ?", (key,))
+                self.total_bytes -= size
+                self.evictions += 1
+
+    def stats(self):
+        with self.lock:
+            self._flush_touches()
+            self.conn.commit()
+            entries = self.conn.execute("SELECT COUNT(*) FROM summaries").fetchone()[0]
+        lookups = self.hits + self.misses
+        return {
+            "entries": entries,
+            "bytes": self.total_bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+    def close(self):
+        with self.lock:
+            self._flush_touches()
+            self.conn.commit()
+            self.conn.close()
+
+
+_summary_cache = None
+
+
+def get_summary_cache():
+    """
+    Process-wide summary cache configured from SUMMARY_CACHE_PATH and SUMMARY_CACHE_MAX_MB.
+    Set SUMMARY_CACHE_PATH to an empty string to disable caching.
+    """
+    global _summary_cache
+    db_path = os.getenv('SUMMARY_CACHE_PATH', 'summary_cache.db')
+    if not db_path:
+        return None
+    if _summary_cache is None or _summary_cache.db_path != db_path:
+        max_mb = float(os.getenv('SUMMARY_CACHE_MAX_MB', '256'))
+        _summary_cache = SummaryCache(db_path, max_bytes=int(max_mb * 1024 * 1024))
+    return _summary_cache
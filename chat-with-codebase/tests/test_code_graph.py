@@ -0,0 +1,112 @@
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from code_graph import CodeGraphIndex
+from code_parsing import extract_hierarchy_with_code
+
+LEVELS = ["folders", "files", "functions", "classes", "methods", "inline_code", "relationships"]
+
+UTIL = '''def helper():
+    return 1
+
+
+class Store:
+    def load(self):
+        return self.read()
+
+    def read(self):
+        return helper()
+'''
+
+APP = '''from pkg.util import helper, Store
+import pkg.util as u
+
+
+def main():
+    helper()
+    Store()
+    return u.helper()
+
+
+class Runner:
+    def load(self):
+        return main()
+'''
+
+
+def write(path, text):
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(text)
+
+
+class CodeGraphTestCase(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.root = os.path.join(self.tmp.name, "src")
+        os.makedirs(os.path.join(self.root, "pkg"))
+        write(os.path.join(self.root, "pkg", "__init__.py"), "")
+        write(os.path.join(self.root, "pkg", "util.py"), UTIL)
+        write(os.path.join(self.root, "pkg", "app.py"), APP)
+        self.util = os.path.join(self.root, "pkg", "util.py")
+        self.app = os.path.join(self.root, "pkg", "app.py")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def parse(self, **options):
+        output_file = os.path.join(self.tmp.name, "code_parser.json")
+        return extract_hierarchy_with_code(self.root, [".py"], LEVELS, output_file, 'False', **options)
+
+    def test_relationships_resolve_imports_and_calls(self):
+        index = CodeGraphIndex(self.root)
+        for entity in self.parse():
+            if entity["type"] != "relationship":
+                index.add(entity)
+        edges = {(r["relationship"], r["source_id"], r["target_id"]) for r in index.relationships()}
+
+        self.assertIn(("IMPORTS", f"file:{self.app}", f"file:{self.util}"), edges)
+        self.assertIn(("IMPORTS", f"file:{self.app}", f"function:{self.util}:helper"), edges)
+        self.assertIn(("IMPORTS", f"file:{self.app}", f"class:{self.util}:Store"), edges)
+        self.assertIn(("CALLS", f"function:{self.app}:main", f"function:{self.util}:helper"), edges)
+        self.assertIn(("CALLS", f"function:{self.app}:main", f"class:{self.util}:Store"), edges)
+        self.assertIn(("CALLS", f"method:{self.util}:Store.load", f"method:{self.util}:Store.read"), edges)
+        self.assertIn(("CALLS", f"method:{self.app}:Runner.load", f"function:{self.app}:main"), edges)
+        # Calls through an import and the aliased module resolve to the same edge once
+        self.assertEqual(len([edge for edge in edges if edge[1] == f"function:{self.app}:main"]), 2)
+
+    def test_relationship_ends_are_parsed_nodes(self):
+        entities = self.parse()
+        ids = {entity["id"] for entity in entities if entity["type"] != "relationship" and entity.get("path")}
+        relationships = [entity for entity in entities if entity["type"] == "relationship"]
+        self.assertTrue(relationships)
+        for relationship in relationships:
+            self.assertIn(relationship["source_id"], ids)
+            self.assertIn(relationship["target_id"], ids)
+
+    def test_methods_are_qualified_by_their_class(self):
+        methods = [entity for entity in self.parse() if entity["type"] == "method"]
+        ids = [entity["id"] for entity in methods]
+        self.assertIn(f"method:{self.util}:Store.load", ids)
+        self.assertIn(f"method:{self.app}:Runner.load", ids)
+        self.assertEqual(len(ids), len(set(ids)))
+        store_load = next(entity for entity in methods if entity["id"] == f"method:{self.util}:Store.load")
+        self.assertEqual(store_load["parent_id"], f"class:{self.util}:Store")
+
+    def test_incremental_run_reuses_unchanged_files(self):
+        self.parse(incremental=True)
+        write(self.app, APP + "\n\ndef extra():\n    return main()\n")
+        reused = []
+        entities = self.parse(incremental=True,
+                              progress=lambda counter, done=1, total=0: reused.append((done, total)))
+
+        self.assertEqual(reused[0], (2, 3))
+        self.assertEqual(entities, self.parse())
+        self.assertIn(f"function:{self.app}:extra", {entity.get("id") for entity in entities})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,67 @@
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from code_parsing import hash_file
+from code_store import CodeStore, line_byte_offsets, make_code_ref, make_lines_ref
+
+LINES = ["import os", "", "def greet(name):", "    return f'héllo {name}'", "", "    "]
+
+
+class CodeStoreTestCase(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.store = CodeStore()
+
+    def tearDown(self):
+        self.store.close()
+        self.tmp.cleanup()
+
+    def write(self, newline):
+        path = os.path.join(self.tmp.name, "module.py")
+        with open(path, "wb") as f:
+            f.write(newline.join(LINES).encode("utf-8") + newline.encode())
+        with open(path, "rb") as f:
+            source = f.read()
+        return path, source
+
+    def test_code_ref_round_trip(self):
+        for newline in ("\n", "\r\n"):
+            path, source = self.write(newline)
+            line_starts = line_byte_offsets(source)
+            code_ref = make_code_ref(line_starts, source, 3, 4)
+            self.assertEqual(self.store.read(path, code_ref), "\n".join(LINES[2:4]))
+            self.assertEqual(self.store.read(path, make_code_ref(line_starts, source, 1, 1)), LINES[0])
+            self.store.close()
+
+    def test_lines_ref_merges_and_strips(self):
+        for newline in ("\n", "\r\n"):
+            path, source = self.write(newline)
+            code_ref = make_lines_ref(line_byte_offsets(source), source, [2, 3, 4, 5, 6], strip=True)
+            self.assertEqual(len(code_ref), 1)
+            self.assertEqual(self.store.read(path, code_ref), "\n".join(LINES[1:6]).strip())
+            self.store.close()
+
+    def test_resolve_rejects_files_changed_after_parsing(self):
+        path, source = self.write("\n")
+        entities = [
+            {"type": "file", "name": "module.py", "path": path, "content_hash": hash_file(path)},
+            {"type": "function_code", "name": "code-greet", "path": path,
+             "code_ref": make_code_ref(line_byte_offsets(source), source, 3, 4)},
+        ]
+        resolved = list(self.store.resolve_entities(dict(entity) for entity in entities))
+        self.assertEqual(resolved[1]["code"], "\n".join(LINES[2:4]))
+        self.assertNotIn("code_ref", resolved[1])
+
+        self.store.close()
+        with open(path, "ab") as f:
+            f.write(b"# edited\n")
+        with self.assertRaises(ValueError):
+            list(self.store.resolve_entities(dict(entity) for entity in entities))
+
+
+if __name__ == '__main__':
+    unittest.main()
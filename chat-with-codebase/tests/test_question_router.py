@@ -0,0 +1,30 @@
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from question_router import route_question
+
+
+class RouteQuestionTestCase(unittest.TestCase):
+    def test_fast_path_questions(self):
+        cases = {
+            "How many functions are there for each python file?": ("functions_per_file", {}),
+            "Show me the code of the file named api.py": ("file_code", {"file_name": "api.py"}),
+            "List all the methods of class CodeStore with their summaries":
+                ("class_methods", {"class_name": "CodeStore"}),
+            "Who calls generate_code_summary?": ("callers", {"function_name": "generate_code_summary"}),
+            "which functions call load_data()": ("callers", {"function_name": "load_data"}),
+            "Which files import 'jobs.py'?": ("file_imports", {"file_name": "jobs.py"}),
+        }
+        for question, expected in cases.items():
+            self.assertEqual(route_question(question), expected, question)
+
+    def test_other_questions_go_to_the_llm(self):
+        for question in ("Explain how the ingest works", "Who calls generate_code_summary and why?", ""):
+            self.assertIsNone(route_question(question), question)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,59 @@
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from schema_pruner import parse_schema, prune_schema, question_tokens
+
+SCHEMA = """Node properties:
+class {id: STRING, name: STRING, path: STRING, docstring: STRING}
+class_code {id: STRING, name: STRING, path: STRING, code: STRING}
+file {id: STRING, name: STRING, path: STRING}
+file_code {id: STRING, name: STRING, path: STRING, code: STRING}
+folder {id: STRING, name: STRING, path: STRING}
+function {id: STRING, name: STRING, path: STRING, docstring: STRING}
+function_code {id: STRING, name: STRING, path: STRING, code: STRING, code_summary: STRING}
+method {id: STRING, name: STRING, path: STRING, docstring: STRING}
+method_code {id: STRING, name: STRING, path: STRING, code: STRING, code_summary: STRING}
+summary {id: STRING, name: STRING, path: STRING, code_summary: STRING}
+Relationship properties:
+
+The relationships:
+(:class)-[:CONTAINS]->(:class_code)
+(:class)-[:CONTAINS]->(:method)
+(:file)-[:CONTAINS]->(:class)
+(:file)-[:CONTAINS]->(:file_code)
+(:file)-[:CONTAINS]->(:function)
+(:file)-[:IMPORTS]->(:file)
+(:folder)-[:CONTAINS]->(:file)
+(:function)-[:CALLS]->(:function)
+(:function)-[:CALLS]->(:method)
+(:function)-[:CONTAINS]->(:function_code)
+(:function)-[:CONTAINS]->(:summary)
+(:method)-[:CALLS]->(:function)
+(:method)-[:CALLS]->(:method)
+(:method)-[:CONTAINS]->(:method_code)"""
+
+
+class SchemaPrunerTestCase(unittest.TestCase):
+    def test_identifiers_in_question_are_not_scored(self):
+        self.assertEqual(question_tokens("Who calls generate_code_summary?"), {"who", "call"})
+        words = question_tokens("Which methods of CodeStore does `load_data` call?")
+        self.assertTrue(words.isdisjoint({"code", "store", "load", "data"}))
+        self.assertIn("method", words)
+
+    def test_caller_question_keeps_the_calls_graph(self):
+        nodes, _, relationships = parse_schema(prune_schema(SCHEMA, "Who calls generate_code_summary?"))
+        self.assertEqual(set(nodes), {"function", "method"})
+        self.assertTrue(relationships)
+        self.assertTrue(all(rel_type == "CALLS" for _, rel_type, _ in relationships))
+
+    def test_summary_question_keeps_summary(self):
+        nodes, _, _ = parse_schema(prune_schema(SCHEMA, "What is the summary of the function?"))
+        self.assertIn("summary", nodes)
+        self.assertIn("function", nodes)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,94 @@
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from neo4j_lib import Neo4jLoader
+
+
+class RecordingTx:
+    def __init__(self, log):
+        self.log = log
+
+    def run(self, query, **params):
+        self.log.append((query, params))
+        return self
+
+    def consume(self):
+        pass
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+    def __iter__(self):
+        return iter([])
+
+
+class RecordingSession:
+    def __init__(self, log):
+        self.log = log
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        pass
+
+    def run(self, query, **params):
+        return RecordingTx(self.log).run(query, **params)
+
+    def execute_write(self, fn, *args, **kwargs):
+        return fn(RecordingTx(self.log), *args, **kwargs)
+
+    def begin_transaction(self):
+        return RecordingTx(self.log)
+
+
+class RecordingDriver:
+    def __init__(self):
+        self.log = []
+
+    def session(self, **kwargs):
+        return RecordingSession(self.log)
+
+
+def file_entities(name, function_names):
+    path = f"./{name}"
+    entities = [{"type": "file", "name": name, "path": path, "parent_name": ".", "parent_type": "folder",
+                 "content_hash": f"hash-{name}"}]
+    entities += [{"type": "function", "name": function, "path": path, "parent_name": name, "parent_type": "file"}
+                 for function in function_names]
+    return entities
+
+
+def calls(source_path, source, target_path, target):
+    return {"type": "relationship", "relationship": "CALLS",
+            "source_type": "function", "source_name": source, "source_path": source_path,
+            "target_type": "function", "target_name": target, "target_path": target_path,
+            "source_id": f"function:{source_path}:{source}", "target_id": f"function:{target_path}:{target}"}
+
+
+class SyncDataTestCase(unittest.TestCase):
+    def test_links_of_last_file_are_written(self):
+        # Relationship records follow every file, so the last file must already count as changed
+        data = [{"type": "folder", "name": ".", "path": ".", "parent_name": None, "parent_type": None}]
+        data += file_entities("a.py", ["first"])
+        data += file_entities("b.py", ["second", "third"])
+        data += [calls("./a.py", "first", "./b.py", "second"), calls("./b.py", "second", "./b.py", "third")]
+
+        driver = RecordingDriver()
+        loader = Neo4jLoader(driver=driver)
+        loader.sync_data(data)
+
+        self.assertEqual(loader.load_stats["files_added"], 2)
+        self.assertEqual(loader.load_stats["relationships"], 2)
+        written = [row for query, params in driver.log if "CALLS" in query for row in params.get("rows", [])]
+        self.assertEqual(len(written), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()